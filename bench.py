@@ -0,0 +1,186 @@
+"""Офлайн-бенчмарк трансформаций эффектов колдуна.
+
+Гоняет каждый эффект из реестра main.EFFECTS по смешанному корпусу
+(латиница, кириллица, эмодзи) на нескольких длинах сообщения и сравнивает
+с сохранённым бейзлайном. Заодно проверяет, что ответ не длиннее
+заявленной эффектом границы Effect.max_size. Токен и сеть не нужны.
+
+Бейзлайн в репозиторий не коммитится (он в .gitignore): ops/sec зависят
+от машины, поэтому его снимают локально с --save до правки эффекта и
+сравнивают с ним после.
+
+    python bench.py                     # прогон и сравнение с бейзлайном
+    python bench.py --save              # прогон и запись нового бейзлайна
+    python bench.py --effects glitch,uwu --lengths 2000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import main
+
+LATIN = (
+    "hello", "world", "the", "wizard", "is", "here", "lol", "what", "are", "you",
+    "doing", "my", "friend", "this", "channel", "cursed", "no", "yes", "thanks", "bro",
+)
+CYRILLIC = (
+    "привет", "как", "дела", "колдун", "опять", "наколдовал", "что", "это", "было",
+    "ну", "давай", "жесть", "шутка", "щас", "хорошо", "нет", "да", "друг", "человек",
+)
+EMOJI = ("😀", "💀", "🔥", "👍", "🤡", "😭", "👀", "🫥", "❤️", "👏🏻")
+PUNCTUATION = ("", "", "", ",", ".", "!", "?", "...")
+
+LENGTHS = (16, 128, 512, 2000)
+CORPUS_SIZE = 32
+
+
+def build_corpus(length: int, seed: int = 1337) -> list[str]:
+    """Набор сообщений ровно заданной длины, воспроизводимый по seed"""
+    rng = random.Random(seed + length)
+    corpus = []
+    for _ in range(CORPUS_SIZE):
+        parts = []
+        size = 0
+        while size < length:
+            roll = rng.random()
+            if roll < 0.45:
+                word = rng.choice(LATIN)
+            elif roll < 0.9:
+                word = rng.choice(CYRILLIC)
+            else:
+                word = rng.choice(EMOJI)
+            if rng.random() < 0.1:
+                word = word.capitalize()
+            word += rng.choice(PUNCTUATION)
+            parts.append(word)
+            size += len(word) + 1
+        corpus.append(" ".join(parts)[:length])
+    return corpus
+
+
+def measure(effect: main.Effect, corpus: list[str], duration: float) -> dict:
+    random.seed(0)
+    transform = effect.transform
+
+    # размер выхода, пиковая память на один вызов и нарушения границы
+    in_size = sum(len(text) for text in corpus)
+    tracemalloc.start()
+    out_size = 0
+    peak = 0
+    over_bound = 0
+    for text in corpus:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        size = len(transform(text))
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+        out_size += size
+        over_bound += size > effect.max_size(len(text))
+    tracemalloc.stop()
+
+    # пропускная способность
+    ops = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        for text in corpus:
+            transform(text)
+        ops += len(corpus)
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+
+    return {
+        "ops_per_sec": ops / (now - start),
+        "peak_bytes": peak,
+        "expansion": out_size / in_size if in_size else 1.0,
+        "over_bound": over_bound,
+    }
+
+
+def check_bounds(results: dict) -> list[str]:
+    """Выходы длиннее Effect.max_size - ошибка независимо от бейзлайна"""
+    return [
+        f"{key}: {current['over_bound']} outputs longer than max_size"
+        for key, current in results.items() if current["over_bound"]
+    ]
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Регрессии относительно бейзлайна: медленнее, прожорливее или длиннее"""
+    regressions = []
+    for key, current in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if current["ops_per_sec"] < old["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{key}: ops/sec {old['ops_per_sec']:.0f} -> {current['ops_per_sec']:.0f}")
+        if current["peak_bytes"] > old["peak_bytes"] * (1 + threshold) + 1024:
+            regressions.append(f"{key}: peak {old['peak_bytes']} -> {current['peak_bytes']} bytes")
+        if current["expansion"] > old["expansion"] * (1 + threshold):
+            regressions.append(f"{key}: expansion {old['expansion']:.2f}x -> {current['expansion']:.2f}x")
+    return regressions
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark for wizard effect transforms")
+    parser.add_argument("--effects", help="comma-separated effect names (default: all)")
+    parser.add_argument("--lengths", default=",".join(map(str, LENGTHS)), help="comma-separated message lengths")
+    parser.add_argument("--duration", type=float, default=0.2, help="seconds per effect and length")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    args = parser.parse_args()
+
+    names = args.effects.split(",") if args.effects else [n for n, e in main.EFFECTS.items() if e.transform]
+    unknown = [n for n in names if n not in main.EFFECTS or main.EFFECTS[n].transform is None]
+    if unknown:
+        print(f"Unknown or non-transform effects: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    lengths = [int(x) for x in args.lengths.split(",")]
+    corpora = {length: build_corpus(length) for length in lengths}
+
+    results = {}
+    print(f"{'effect':<18}{'len':>6}{'ops/sec':>12}{'peak KiB':>10}{'expand':>8}")
+    for name in names:
+        effect = main.EFFECTS[name]
+        for length in lengths:
+            result = measure(effect, corpora[length], args.duration)
+            results[f"{name}@{length}"] = result
+            print(
+                f"{name:<18}{length:>6}{result['ops_per_sec']:>12.0f}"
+                f"{result['peak_bytes'] / 1024:>10.1f}{result['expansion']:>7.2f}x"
+            )
+
+    broken = check_bounds(results)
+    for line in broken:
+        print(f"REGRESSION {line}")
+
+    if args.save:
+        if broken:
+            return 1
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, run with --save to create one")
+        return 1 if broken else 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions and not broken:
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 1 if regressions or broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,91 @@
+"""Эффекты колдуна как плагины.
+
+Каждый эффект - отдельный модуль с атрибутом EFFECT: готовый Effect или
+фабрика options -> Effect, где options - его секция из wizard.effects.
+Встроенные эффекты лежат в этом пакете, сторонние наборы подключаются
+через entry points группы "toxicity.effects" без правки main.py:
+
+    [project.entry-points."toxicity.effects"]
+    rainbow = "my_pack.rainbow"
+
+Модуль импортируется и компилирует свои таблицы только при первом
+обращении к эффекту, то есть когда колдун его выбрал.
+"""
+
+import collections.abc
+import importlib
+import importlib.metadata
+import logging
+import pkgutil
+import types
+from typing import Callable
+
+from effects.base import Effect
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "toxicity.effects"
+
+
+class EffectRegistry(collections.abc.Mapping):
+    """Имя эффекта -> Effect, модули плагинов грузятся по первому запросу"""
+
+    def __init__(self):
+        self.sources: dict[str, Callable[[], object]] = {}
+        self.loaded: dict[str, Effect] = {}
+        self.options: dict[str, dict] = {}
+        # проверка загруженного эффекта снаружи (стратегии отправки живут в main)
+        self.check: Callable[[Effect], None] | None = None
+
+    def discover(self):
+        """Собирает имена встроенных эффектов и entry points, ничего не импортируя"""
+        for info in pkgutil.iter_modules(__path__):
+            if info.name != "base":
+                self.sources[info.name] = lambda module=f"{__name__}.{info.name}": importlib.import_module(module)
+        for entry in importlib.metadata.entry_points(group=ENTRY_POINT_GROUP):
+            if entry.name in self.sources:
+                logger.warning("Effect plugin %s (%s) shadowed by a built-in effect", entry.name, entry.value)
+                continue
+            self.sources[entry.name] = entry.load
+
+    def configure(self, options: dict):
+        """Новые параметры эффектов: изменившиеся эффекты соберутся заново"""
+        options = {name: params or {} for name, params in options.items()}
+        for name in list(self.loaded):
+            if name in self.sources and options.get(name, {}) != self.options.get(name, {}):
+                del self.loaded[name]
+        self.options = options
+
+    def register(self, effect: Effect):
+        """Эффект, собранный на месте (стопки хаоса)"""
+        self.loaded[effect.name] = effect
+
+    def load(self, name: str) -> Effect:
+        plugin = self.sources[name]()
+        if isinstance(plugin, types.ModuleType):
+            plugin = plugin.EFFECT
+        effect = plugin if isinstance(plugin, Effect) else plugin(self.options.get(name, {}))
+        if not isinstance(effect, Effect) or effect.name != name:
+            raise TypeError(f"effect plugin {name!r} must provide Effect named {name!r}")
+        if self.check is not None:
+            self.check(effect)
+        logger.debug("Effect %s loaded", name)
+        return effect
+
+    def __getitem__(self, name: str) -> Effect:
+        effect = self.loaded.get(name)
+        if effect is None:
+            if name not in self.sources:
+                raise KeyError(name)
+            effect = self.loaded[name] = self.load(name)
+        return effect
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.loaded or name in self.sources
+
+    def __iter__(self):
+        yield from self.sources
+        yield from (name for name in self.loaded if name not in self.sources)
+
+    def __len__(self) -> int:
+        return len(self.sources.keys() | self.loaded.keys())
@@ -0,0 +1,25 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+ANGRY_RU_INSERTS = ("БЛИН", "ААААА", "ДА КАК ТАК", "ЧЁРТ", "ОЙ ВСЁ")
+ANGRY_EN_INSERTS = ("UGH", "ARGH", "GRRRR", "DAMN", "SERIOUSLY")
+ANGRY_EMOJIS = ("😡", "🤬", "💢", "👿", "😤")
+
+def angry_text(text: str, profile: TextProfile | None = None) -> str:
+    """ЗЛОЙ ТЕКСТ 😡"""
+    profile = profile or TextProfile(text)
+    text = text.upper()
+    angry_inserts = ANGRY_RU_INSERTS if profile.cyrillic else ANGRY_EN_INSERTS
+
+    words = text.split()
+    result = []
+    for word in words:
+        result.append(word)
+        if random.random() < 0.2:
+            result.append(random.choice(angry_inserts))
+
+    return " ".join(result) + " " + random.choice(ANGRY_EMOJIS) * random.randint(1, 3)
+
+EFFECT = Effect("angry", angry_text, expansion=(8.5, 10))
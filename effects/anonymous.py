@@ -0,0 +1,7 @@
+"""Сообщения уходят анонимными эмбедами"""
+
+from effects.base import Effect
+
+
+# общие сообщения очереди нельзя откатить, поэтому сначала удаление
+EFFECT = Effect("anonymous", needs_webhook=False, send="embed", pipelined=False)
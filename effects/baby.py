@@ -0,0 +1,32 @@
+import random
+
+from effects.base import Effect, compile_char_map, TextProfile
+
+
+BABY_RU_TABLE = compile_char_map({
+    "р": "л", "Р": "Л", "ш": "с", "Ш": "С",
+    "ж": "з", "Ж": "З", "щ": "с", "Щ": "С",
+})
+BABY_EN_TABLE = compile_char_map({"r": "w", "R": "W", "l": "w", "L": "W"})
+BABY_RU_WORDS = ("агу", "ня", "мама", "дай", "хочу", "ааа")
+BABY_EN_WORDS = ("goo goo", "ga ga", "mama", "dada", "waah")
+
+def baby_text(text: str, profile: TextProfile | None = None) -> str:
+    """Детский лепет - агу агу"""
+    profile = profile or TextProfile(text)
+    if profile.cyrillic:
+        # Русский детский
+        text = text.translate(BABY_RU_TABLE)
+        baby_words = BABY_RU_WORDS
+    else:
+        text = text.translate(BABY_EN_TABLE)
+        baby_words = BABY_EN_WORDS
+
+    if random.random() < 0.3:
+        text = f"{random.choice(baby_words)}! {text}"
+    if random.random() < 0.3:
+        text = f"{text} {random.choice(baby_words)}!"
+
+    return text
+
+EFFECT = Effect("baby", baby_text, expansion=(1.0, 20))
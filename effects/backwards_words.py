@@ -0,0 +1,10 @@
+from effects.base import Effect, TextProfile, word_stage
+
+
+def backwards_words_text(text: str, profile: TextProfile | None = None) -> str:
+    """Каждое слово задом наперёд"""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    return " ".join(word[::-1] for word in words)
+
+EFFECT = Effect("backwards_words", backwards_words_text, stage=word_stage(lambda w: w[::-1]), deterministic=True)
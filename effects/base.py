@@ -0,0 +1,137 @@
+"""Общая часть эффектов колдуна.
+
+Разбор текста, блоки случайности, компиляция таблиц, пословные стадии
+хаоса и сам Effect. Модули эффектов и сторонние плагины берут всё
+отсюда, а не из main.py.
+"""
+
+import functools
+import math
+import random
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+
+# ==================== утилиты ====================
+
+CYRILLIC_RE = re.compile(r'[а-яА-ЯёЁіІїЇєЄґҐ]')
+WORD_RE = re.compile(r'\S+')
+
+def is_cyrillic(char: str) -> bool:
+    """Проверяет, является ли символ кириллицей"""
+    return CYRILLIC_RE.match(char) is not None
+
+def is_letter(char: str) -> bool:
+    """Проверяет, является ли символ буквой (латиница или кириллица)"""
+    return char.isalpha()
+
+
+class TextProfile:
+    """Разбор сообщения, общий для всех эффектов.
+
+    Считается один раз на сообщение: язык и слова сразу (это проходы
+    на C), позиции слов и букв - при первом обращении.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.cyrillic = CYRILLIC_RE.search(text) is not None
+        self.words = tuple(text.split())
+
+    @functools.cached_property
+    def spans(self) -> tuple[tuple[int, int], ...]:
+        """(начало, конец) каждого слова в исходном тексте"""
+        return tuple(m.span() for m in WORD_RE.finditer(self.text))
+
+    @functools.cached_property
+    def letters(self) -> tuple[int, ...]:
+        """Индексы букв в исходном тексте"""
+        return tuple(i for i, char in enumerate(self.text) if char.isalpha())
+
+
+# ==================== случайность ====================
+
+ENTROPY_BITS = 16
+
+def entropy(count: int, seed: int | None = None) -> memoryview:
+    """Один блок из count случайных 16-битных чисел на сообщение.
+
+    Эффекты берут из блока по индексу вместо вызова random на каждый
+    символ. С seed результат воспроизводим.
+    """
+    rng = random.Random(seed) if seed is not None else random
+    return memoryview(rng.randbytes(2 * count)).cast("H")
+
+def chance(p: float) -> int:
+    """Порог: число из блока меньше него с вероятностью p"""
+    return round(p * (1 << ENTROPY_BITS))
+
+# Равномерный индекс в [0, k) из числа блока: (число * k) >> ENTROPY_BITS.
+# Если число уже прошло проверку "< порога", оно равномерно в [0, порог),
+# и его можно использовать ещё раз: число * k // порог - тоже равномерный
+# индекс. Так на одно случайное событие уходит одно число, а не два.
+
+
+# ==================== компиляция эффектов ====================
+
+def compile_char_map(mapping: dict[str, str]) -> dict[int, str]:
+    """Собирает таблицу для str.translate из посимвольных замен"""
+    return str.maketrans(mapping)
+
+def compile_substitutions(mapping: dict[str, str]):
+    """Собирает однопроходную замену подстрок на одной регулярке.
+
+    Подстроки не должны перекрываться и порождать друг друга -
+    тогда результат совпадает с цепочкой str.replace.
+    """
+    pattern = re.compile("|".join(re.escape(k) for k in sorted(mapping, key=len, reverse=True)))
+    lookup = mapping.__getitem__
+
+    def substitute(text: str) -> str:
+        return pattern.sub(lambda m: lookup(m.group()), text)
+
+    return substitute
+
+
+# ==================== пословные стадии ====================
+
+@dataclass(frozen=True)
+class TokenStage:
+    """Пословная часть эффекта для слитного конвейера (хаос).
+
+    start получает разбор сообщения и возвращает функцию слово -> слово,
+    поэтому стадия может держать своё состояние в пределах сообщения
+    (чередование регистра, блок случайности).
+    """
+    start: Callable[[TextProfile], Callable[[str], str]]
+    joiner: str | None = None    # свой разделитель слов - такая стадия идёт последней
+    suffix: str = ""
+    splits: bool = True          # сам эффект склеивает слова через один пробел
+
+def word_stage(fn: Callable[[str], str], splits: bool = True) -> TokenStage:
+    """Стадия без состояния"""
+    return TokenStage(lambda profile: fn, splits=splits)
+
+
+# ==================== эффект ====================
+
+@dataclass(frozen=True)
+class Effect:
+    """Эффект колдуна: как менять текст и как отправлять результат"""
+    name: str
+    transform: Callable[[str, TextProfile | None], str] | None = None
+    needs_webhook: bool = True
+    needs_delete: bool = True
+    send: str | None = "webhook"     # ключ в SENDERS, None - сообщения не трогаем
+    pipelined: bool = True           # можно удалять оригинал параллельно с отправкой
+    slowmode: bool = False
+    stage: TokenStage | None = None  # есть - эффект можно ставить в хаос
+    deterministic: bool = False      # выход зависит только от текста - можно кэшировать
+    cost: float = 0.1                # оценка в мкс на символ входа: считать в цикле или в пуле
+    # худший случай длины ответа: factor * len(text) + extra
+    expansion: tuple[float, int] = (1.0, 0)
+
+    def max_size(self, length: int) -> int:
+        factor, extra = self.expansion
+        return math.ceil(factor * length) + extra
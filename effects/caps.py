@@ -0,0 +1,9 @@
+"""ВСЁ ЗАГЛАВНЫМИ"""
+
+from effects.base import Effect, word_stage
+
+
+EFFECT = Effect(
+    "caps", lambda t, p=None: t.upper(), stage=word_stage(str.upper, splits=False), expansion=(3.0, 0),
+    deterministic=True,
+)
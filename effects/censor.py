@@ -0,0 +1,24 @@
+from typing import Callable
+
+from effects.base import Effect, chance, entropy, TextProfile, TokenStage
+
+
+CENSOR_CHANCE = chance(0.35)
+
+def censor_text(text: str, profile: TextProfile | None = None, *, seed: int | None = None) -> str:
+    """Цензура случайных слов"""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    result = []
+    for word, roll in zip(words, entropy(len(words), seed)):
+        if roll < CENSOR_CHANCE and len(word) > 2:
+            result.append("█" * len(word))
+        else:
+            result.append(word)
+    return " ".join(result)
+
+def censor_stage(profile: TextProfile) -> Callable[[str], str]:
+    rolls = iter(entropy(len(profile.words)))
+    return lambda word: "█" * len(word) if next(rolls) < CENSOR_CHANCE and len(word) > 2 else word
+
+EFFECT = Effect("censor", censor_text, stage=TokenStage(censor_stage))
@@ -0,0 +1,13 @@
+from effects.base import Effect, TextProfile, TokenStage
+
+
+def clap_text(text: str, profile: TextProfile | None = None) -> str:
+    """Каждое 👏 слово 👏 с 👏 хлопком"""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    return " 👏 ".join(words) + " 👏"
+
+EFFECT = Effect(
+    "clap", clap_text, stage=TokenStage(lambda p: str, joiner=" 👏 ", suffix=" 👏"), expansion=(2.0, 2),
+    deterministic=True,
+)
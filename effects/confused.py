@@ -0,0 +1,39 @@
+from effects.base import Effect, chance, entropy, ENTROPY_BITS, TextProfile
+
+
+CONFUSED_DOUBLE_CHANCE = chance(0.2)
+CONFUSED_SWAP_CHANCE = chance(0.3)
+
+def confused_text(text: str, profile: TextProfile | None = None, *, seed: int | None = None) -> str:
+    """Путаница в буквах"""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    # по числу на символ и по три на слово: шанс перестановки и две позиции
+    bits = entropy(len(text) + 3 * len(words), seed)
+    pos = 0
+    result = []
+    for word in words:
+        # Дублируем случайные буквы
+        end = pos + len(word)
+        new_word = [
+            char * 2 if roll < CONFUSED_DOUBLE_CHANCE and char.isalpha() else char
+            for char, roll in zip(word, bits[pos:end])
+        ]
+        pos = end
+        # Меняем местами случайные буквы
+        if len(new_word) > 3 and bits[pos] < CONFUSED_SWAP_CHANCE:
+            indices = [j for j in range(len(new_word)) if new_word[j].isalpha()]
+            if len(indices) >= 2:
+                # две разные позиции, как random.sample(indices, 2)
+                a = bits[pos + 1] * len(indices) >> ENTROPY_BITS
+                b = bits[pos + 2] * (len(indices) - 1) >> ENTROPY_BITS
+                if b >= a:
+                    b += 1
+                i, j = indices[a], indices[b]
+                new_word[i], new_word[j] = new_word[j], new_word[i]
+        pos += 3
+        result.append("".join(new_word))
+    
+    return " ".join(result) + "???"
+
+EFFECT = Effect("confused", confused_text, expansion=(2.0, 3), cost=0.6)
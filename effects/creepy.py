@@ -0,0 +1,30 @@
+from effects.base import Effect, chance, entropy, ENTROPY_BITS, TextProfile
+
+
+CREEPY_STRETCH_CHANCE = chance(0.2)
+CREEPY_EMOJIS = ("👁️", "🌚", "👀", "🫥", "💀", "🕷️")
+CREEPY_RU_ADDS = ("...", " хе-хе-хе...", " я вижу тебя...", " беги...", "")
+CREEPY_EN_ADDS = ("...", " hehe...", " I see you...", " run...", "")
+
+def creepy_text(text: str, profile: TextProfile | None = None, *, seed: int | None = None) -> str:
+    """Жуткий текст..."""
+    profile = profile or TextProfile(text)
+    creepy_adds = CREEPY_RU_ADDS if profile.cyrillic else CREEPY_EN_ADDS
+
+    # пробелы не буквы, поэтому растягивать можно сразу склеенный текст
+    text = " ".join(text.lower().split())
+    n = len(text)
+    bits = entropy(n + 3, seed)
+    # Растягиваем случайные буквы
+    text = "".join([
+        char * (2 + roll * 3 // CREEPY_STRETCH_CHANCE)
+        if roll < CREEPY_STRETCH_CHANCE and char.isalpha() else char
+        for char, roll in zip(text, bits[:n])
+    ])
+
+    start = CREEPY_EMOJIS[bits[n] * len(CREEPY_EMOJIS) >> ENTROPY_BITS]
+    add = creepy_adds[bits[n + 1] * len(creepy_adds) >> ENTROPY_BITS]
+    end = CREEPY_EMOJIS[bits[n + 2] * len(CREEPY_EMOJIS) >> ENTROPY_BITS]
+    return f"{start} {text}{add} {end}"
+
+EFFECT = Effect("creepy", creepy_text, expansion=(8.0, 25), cost=0.3)
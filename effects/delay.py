@@ -0,0 +1,7 @@
+"""Репост приходит с опозданием"""
+
+from effects.base import Effect
+
+
+# репост уйдёт через несколько секунд, спешить с удалением незачем
+EFFECT = Effect("delay", send="delay", pipelined=False)
@@ -0,0 +1,6 @@
+"""Каждое сообщение приходит дважды"""
+
+from effects.base import Effect
+
+
+EFFECT = Effect("double", send="double")
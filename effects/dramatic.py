@@ -0,0 +1,17 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+def dramatic_text(text: str, profile: TextProfile | None = None) -> str:
+    """Драматичные... паузы... везде..."""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    result = []
+    for i, word in enumerate(words):
+        result.append(word)
+        if random.random() < 0.4 or i == len(words) - 1:
+            result.append("...")
+    return " ".join(result)
+
+EFFECT = Effect("dramatic", dramatic_text, expansion=(3.0, 2))
@@ -0,0 +1,25 @@
+from effects.base import Effect, chance, entropy, ENTROPY_BITS, TextProfile
+
+
+DRUNK_REPEAT_CHANCE = chance(0.15)
+DRUNK_HICCUP_CHANCE = chance(0.05)
+DRUNK_HICCUPS = ('...', ' *ик*', ' *хик*', ' ', '', ' ыыы')
+DRUNK_ENDINGS = (" *ик*", " *хик*", "...", " ззз", " *бурп*", " хехе", "")
+
+def drunk_text(text: str, profile: TextProfile | None = None, *, seed: int | None = None) -> str:
+    """Пьяный текст"""
+    n = len(text)
+    # на символ два числа: повтор буквы и иканье; в конце - концовка
+    bits = entropy(2 * n + 1, seed)
+    result = []
+    append = result.append
+    for char, repeat, hiccup in zip(text, bits[:n], bits[n:2 * n]):
+        append(char)
+        if repeat < DRUNK_REPEAT_CHANCE and char.isalpha():
+            append(char * (1 + repeat * 3 // DRUNK_REPEAT_CHANCE))
+        if hiccup < DRUNK_HICCUP_CHANCE:
+            append(DRUNK_HICCUPS[hiccup * len(DRUNK_HICCUPS) // DRUNK_HICCUP_CHANCE])
+
+    return "".join(result) + DRUNK_ENDINGS[bits[2 * n] * len(DRUNK_ENDINGS) >> ENTROPY_BITS]
+
+EFFECT = Effect("drunk", drunk_text, expansion=(10.0, 7), cost=0.3)
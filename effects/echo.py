@@ -0,0 +1,26 @@
+from effects.base import Effect, TextProfile
+
+
+def echo_text(text: str, profile: TextProfile | None = None) -> str:
+    """Эхо эхо хо о..."""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    if len(words) < 1:
+        return text
+    
+    last_word = words[-1]
+    if len(last_word) < 3:
+        return text + "... " + last_word + "..."
+    
+    echo_parts = []
+    for i in range(min(3, len(last_word) - 1)):
+        start = max(1, len(last_word) - 2 - i)
+        part = last_word[start:].lower()
+        if part:
+            echo_parts.append(part)
+    
+    if echo_parts:
+        return text + "... " + "... ".join(echo_parts) + "..."
+    return text + "..."
+
+EFFECT = Effect("echo", echo_text, expansion=(4.0, 10), deterministic=True)
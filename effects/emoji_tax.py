@@ -0,0 +1,19 @@
+"""Налог на эмодзи: набор берётся из wizard.effects.emoji_tax.emojis"""
+
+import random
+
+from effects.base import Effect, TextProfile
+
+
+DEFAULT_EMOJIS = ("🤡", "💀", "👺")
+
+def build(options: dict) -> Effect:
+    emojis = tuple(options.get("emojis") or DEFAULT_EMOJIS)
+
+    def emoji_tax_text(text: str, profile: TextProfile | None = None) -> str:
+        """Налог на эмодзи"""
+        return f"{text} {random.choice(emojis)}"
+
+    return Effect("emoji_tax", emoji_tax_text, expansion=(1.0, 1 + max(map(len, emojis))))
+
+EFFECT = build
@@ -0,0 +1,17 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+EXPLOSIONS = ("💥", "🔥", "✨", "⚡", "🌟", "💫", "☄️", "🎆", "🎇", "💣", "🧨")
+
+def explosion_text(text: str, profile: TextProfile | None = None) -> str:
+    """💥 BOOM 💥 эффекты везде"""
+    text = text.upper()
+    words = text.split()
+    result = []
+    for word in words:
+        result.append(f"{random.choice(EXPLOSIONS)} {word}")
+    return " ".join(result) + f" {random.choice(EXPLOSIONS)}"
+
+EFFECT = Effect("explosion", explosion_text, expansion=(4.5, 3))
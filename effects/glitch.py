@@ -0,0 +1,34 @@
+from effects.base import Effect, entropy, ENTROPY_BITS, TextProfile
+
+
+ZALGO_CHARS = (
+    '\u0300', '\u0301', '\u0302', '\u0303', '\u0304', '\u0305', '\u0306', '\u0307',
+    '\u0308', '\u0309', '\u030A', '\u030B', '\u030C', '\u030D', '\u030E', '\u030F',
+    '\u0310', '\u0311', '\u0312', '\u0313', '\u0314', '\u0315', '\u031A', '\u031B',
+    '\u033D', '\u033E', '\u033F', '\u0340', '\u0341', '\u0342', '\u0343', '\u0344',
+    '\u0346', '\u034A', '\u034B', '\u034C', '\u0350', '\u0351', '\u0352', '\u0357',
+)
+
+def glitch_text(text: str, profile: TextProfile | None = None, *, seed: int | None = None) -> str:
+    """З̷а̸л̵г̶о̷ текст"""
+    n = len(text)
+    # на символ два числа: из первого - число диакритик (1-3) и первая,
+    # из второго - вторая и третья (40 * 40 < 2 ** 16)
+    bits = entropy(2 * n, seed)
+    zalgo = ZALGO_CHARS
+    k = len(zalgo)
+    result = []
+    append = result.append
+    for char, first, rest in zip(text, bits[:n], bits[n:]):
+        append(char)
+        if char.isalpha():
+            count, first = divmod(first * 3, 1 << ENTROPY_BITS)
+            append(zalgo[first * k >> ENTROPY_BITS])
+            if count:
+                second, third = divmod(rest * k * k >> ENTROPY_BITS, k)
+                append(zalgo[second])
+                if count == 2:
+                    append(zalgo[third])
+    return "".join(result)
+
+EFFECT = Effect("glitch", glitch_text, expansion=(4.0, 0), cost=0.8)
@@ -0,0 +1,23 @@
+import random
+
+from effects.base import Effect, TextProfile
+from effects.leetspeak import leetspeak_text
+
+
+HACKER_RU_PREFIXES = (
+    "[ПЕРЕХВАЧЕНО]:", "[РАСШИФРОВАНО]:", "[ВЗЛОМ СИСТЕМЫ]:",
+    "[УТЕЧКА ДАННЫХ]:", "[СЛЕЖКА]:", ">>> ВЫВОД:",
+)
+HACKER_EN_PREFIXES = (
+    "[INTERCEPTED]:", "[DECRYPTED]:", "[SYSTEM BREACH]:",
+    "[DATA LEAK]:", "[TRACE DETECTED]:", ">>> STDOUT:",
+)
+
+def hacker_text(text: str, profile: TextProfile | None = None) -> str:
+    """[SYSTEM]: Message intercepted..."""
+    profile = profile or TextProfile(text)
+    prefixes = HACKER_RU_PREFIXES if profile.cyrillic else HACKER_EN_PREFIXES
+    glitched = leetspeak_text(text)
+    return f"```\n{random.choice(prefixes)} {glitched}\n```"
+
+EFFECT = Effect("hacker", hacker_text, expansion=(1.0, 30))
@@ -0,0 +1,22 @@
+from effects.base import Effect, compile_char_map, TextProfile, word_stage
+
+
+LEET_TABLE = compile_char_map({
+    # Английские
+    'a': '4', 'A': '4', 'e': '3', 'E': '3', 'i': '1', 'I': '1',
+    'o': '0', 'O': '0', 's': '5', 'S': '5', 't': '7', 'T': '7',
+    'b': '8', 'B': '8', 'g': '9', 'G': '9',
+    # Русские
+    'а': '4', 'А': '4', 'е': '3', 'Е': '3', 'ё': '3', 'Ё': '3',
+    'о': '0', 'О': '0', 'з': '3', 'З': '3', 'ч': '4', 'Ч': '4',
+    'б': '6', 'Б': '6', 'в': '8', 'В': '8', 'т': '7', 'Т': '7',
+    'и': '1', 'И': '1', 'й': '1', 'Й': '1', 'л': '7', 'Л': '7',
+})
+
+def leetspeak_text(text: str, profile: TextProfile | None = None) -> str:
+    """1337 5p34k для русского и английского"""
+    return text.translate(LEET_TABLE)
+
+EFFECT = Effect(
+    "leetspeak", leetspeak_text, stage=word_stage(lambda w: w.translate(LEET_TABLE), splits=False), deterministic=True
+)
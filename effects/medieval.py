@@ -0,0 +1,42 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+# Старославянский стиль
+MEDIEVAL_RU_WORDS = {
+    "ты": "ты, сударь", "вы": "вы, милостивый государь",
+    "я": "аз", "мы": "мы, грешные",
+    "есть": "есьм", "быть": "быти",
+    "говорить": "молвити", "сказать": "рекоша",
+    "хорошо": "зело добре", "плохо": "худо",
+    "да": "истинно", "нет": "несть",
+    "привет": "здравия желаю", "пока": "прощевай",
+    "друг": "друже", "человек": "человече",
+    "что": "чаво", "как": "како",
+}
+MEDIEVAL_RU_STARTS = ("Внемлите!", "Слушайте же!", "Азъ реку:", "Истинно глаголю:", "Вот те крест!")
+MEDIEVAL_RU_ENDS = (", сударь.", ", батюшка.", ", истинно.", "")
+MEDIEVAL_EN_WORDS = {
+    "you": "thee", "your": "thy", "yours": "thine",
+    "are": "art", "is": "be", "have": "hast", "has": "hath",
+    "will": "shall", "do": "doth", "hello": "hail",
+    "hi": "greetings", "good": "most wondrous",
+}
+MEDIEVAL_EN_STARTS = ("Hark!", "Hear ye!", "Prithee,", "Forsooth,", "Verily,")
+MEDIEVAL_EN_ENDS = (", m'lord.", ", good sir.", ", I say!", "")
+
+def medieval_text(text: str, profile: TextProfile | None = None) -> str:
+    """Старинный стиль - русский и английский"""
+    profile = profile or TextProfile(text)
+    if profile.cyrillic:
+        replacements, starts, ends = MEDIEVAL_RU_WORDS, MEDIEVAL_RU_STARTS, MEDIEVAL_RU_ENDS
+    else:
+        replacements, starts, ends = MEDIEVAL_EN_WORDS, MEDIEVAL_EN_STARTS, MEDIEVAL_EN_ENDS
+
+    words = text.lower().split()
+    result = [replacements.get(w, w) for w in words]
+
+    return f"{random.choice(starts)} {' '.join(result)}{random.choice(ends)}"
+
+EFFECT = Effect("medieval", medieval_text, expansion=(12.0, 40))
@@ -0,0 +1,7 @@
+"""Slowmode подлиннее, длительность берётся из wizard.effects.mega_slowmode"""
+
+from effects.base import Effect
+
+
+# Slowmode обрабатывается Discord'ом
+EFFECT = Effect("mega_slowmode", needs_webhook=False, needs_delete=False, send=None, slowmode=True)
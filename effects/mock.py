@@ -0,0 +1,35 @@
+from typing import Callable
+
+from effects.base import Effect, TextProfile, TokenStage
+
+
+def mock_text(text: str, profile: TextProfile | None = None) -> str:
+    """СаРкАзМ тЕкСт - работает с любым алфавитом"""
+    profile = profile or TextProfile(text)
+    letters = profile.letters
+    result = list(text)
+    for i in letters[0::2]:
+        result[i] = result[i].lower()
+    for i in letters[1::2]:
+        result[i] = result[i].upper()
+    return "".join(result)
+
+def mock_stage(profile: TextProfile) -> Callable[[str], str]:
+    upper = False
+
+    def mock_word(word: str) -> str:
+        nonlocal upper
+        result = []
+        for char in word:
+            if char.isalpha():
+                result.append(char.upper() if upper else char.lower())
+                upper = not upper
+            else:
+                result.append(char)
+        return "".join(result)
+
+    return mock_word
+
+EFFECT = Effect(
+    "mock", mock_text, stage=TokenStage(mock_stage, splits=False), expansion=(3.0, 0), deterministic=True, cost=0.3
+)
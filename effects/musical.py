@@ -0,0 +1,17 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+MUSICAL_NOTES = ("🎵", "🎶", "🎼", "🎤", "🎸", "🎹", "🎺", "🎻", "🥁", "🪘", "🎧", "🎷")
+
+def musical_text(text: str, profile: TextProfile | None = None) -> str:
+    """🎵 Каждое слово как песня 🎶"""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    result = []
+    for word in words:
+        result.append(f"{random.choice(MUSICAL_NOTES)} {word}")
+    return " ".join(result) + f" {random.choice(MUSICAL_NOTES)}"
+
+EFFECT = Effect("musical", musical_text, expansion=(2.0, 3))
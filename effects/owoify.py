@@ -0,0 +1,40 @@
+import random
+
+from effects.base import Effect, compile_char_map, compile_substitutions, TextProfile
+
+
+# ж -> ш и ш -> ф в одной таблице: translate меняет всё за один проход,
+# поэтому ж не превращается дальше в ф - так же, как в исходной цепочке replace
+OWO_RU_TABLE = compile_char_map({
+    "р": "в", "Р": "В", "л": "в", "Л": "В", "ш": "ф", "Ш": "Ф",
+    "щ": "ф", "Щ": "Ф", "ж": "ш", "Ж": "Ш",
+})
+OWO_RU_SUBS = compile_substitutions({"на": "ня", "На": "Ня", "ни": "ни~", "Ни": "Ни~"})
+OWO_EN_TABLE = compile_char_map({"r": "w", "R": "W", "l": "w", "L": "W"})
+OWO_EN_SUBS = compile_substitutions({
+    "na": "nya", "Na": "Nya", "ni": "nyi", "Ni": "Nyi", "no": "nyo", "No": "Nyo",
+})
+OWO_RU_FACES = ("OwO", "UwU", ">w<", "^w^", "ня~", "нян!", ":3", "(✿◠‿◠)")
+OWO_EN_FACES = ("OwO", "UwU", ">w<", "^w^", "~w~", ":3", "(✿◠‿◠)", "nyaa~")
+
+def owoify_text(text: str, profile: TextProfile | None = None) -> str:
+    """OwO что это? - более агрессивный uwu"""
+    profile = profile or TextProfile(text)
+    if profile.cyrillic:
+        text = OWO_RU_SUBS(text.translate(OWO_RU_TABLE))
+        faces = OWO_RU_FACES
+    else:
+        text = OWO_EN_SUBS(text.translate(OWO_EN_TABLE))
+        faces = OWO_EN_FACES
+
+    # Добавляем случайные лица
+    words = text.split()
+    result = []
+    for word in words:
+        result.append(word)
+        if random.random() < 0.15:
+            result.append(random.choice(faces))
+
+    return " ".join(result)
+
+EFFECT = Effect("owoify", owoify_text, expansion=(5.5, 4), cost=0.3)
@@ -0,0 +1,40 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+# Русский пиратский
+PIRATE_RU_WORDS = {
+    "привет": "йо-хо-хо", "здравствуй": "йо-хо-хо", "здравствуйте": "йо-хо-хо",
+    "да": "так точно, капитан", "нет": "никак нет", "хорошо": "добре",
+    "друг": "морской волк", "друзья": "морские волки", "деньги": "дублоны",
+    "человек": "морской пёс", "люди": "морские псы", "ты": "ты, каналья",
+    "я": "йа, пират", "мы": "мы, пираты", "мой": "мой пиратский",
+    "пойдём": "отдать швартовы", "идём": "полный вперёд",
+}
+PIRATE_RU_STARTS = ("Йо-хо-хо!", "Тысяча чертей!", "Разрази меня гром!", "Карамба!", "Пиастры!")
+PIRATE_RU_ENDS = (", тысяча чертей!", ", морской волк!", ", каналья!", ", йо-хо-хо!", "")
+# Английский пиратский
+PIRATE_EN_WORDS = {
+    "my": "me", "you": "ye", "your": "yer", "is": "be", "are": "be",
+    "hello": "ahoy", "hi": "ahoy", "friend": "matey", "friends": "mateys",
+    "man": "landlubber", "money": "doubloons", "treasure": "booty",
+    "yes": "aye", "no": "nay", "the": "th'",
+}
+PIRATE_EN_STARTS = ("Arr!", "Yarr!", "Ahoy!", "Avast!", "Shiver me timbers!")
+PIRATE_EN_ENDS = (", matey!", ", arr!", ", ye scallywag!", "")
+
+def pirate_text(text: str, profile: TextProfile | None = None) -> str:
+    """Пиратский говор - русский и английский"""
+    profile = profile or TextProfile(text)
+    if profile.cyrillic:
+        replacements, starts, ends = PIRATE_RU_WORDS, PIRATE_RU_STARTS, PIRATE_RU_ENDS
+    else:
+        replacements, starts, ends = PIRATE_EN_WORDS, PIRATE_EN_STARTS, PIRATE_EN_ENDS
+
+    words = text.lower().split()
+    result = [replacements.get(w, w) for w in words]
+
+    return f"{random.choice(starts)} {' '.join(result)}{random.choice(ends)}"
+
+EFFECT = Effect("pirate", pirate_text, expansion=(10.0, 40))
@@ -0,0 +1,8 @@
+from effects.base import Effect, TextProfile
+
+
+def reverse_text(text: str, profile: TextProfile | None = None) -> str:
+    """Текст задом наперёд"""
+    return text[::-1]
+
+EFFECT = Effect("reverse", reverse_text, deterministic=True)
@@ -0,0 +1,17 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+ROBOT_RU_PREFIXES = ("БИП БУП.", "[ОБРАБОТКА]", "[ПЕРЕДАЧА]", "01100010:", "[РОБОТ]")
+ROBOT_EN_PREFIXES = ("BEEP BOOP.", "[PROCESSING]", "[TRANSMISSION]", "01100010:", "[ROBOT]")
+
+def robot_text(text: str, profile: TextProfile | None = None) -> str:
+    """BEEP. BOOP. ROBOT. SPEAK."""
+    profile = profile or TextProfile(text)
+    words = text.upper().split()
+    result = ". ".join(words) + "."
+    prefixes = ROBOT_RU_PREFIXES if profile.cyrillic else ROBOT_EN_PREFIXES
+    return f"{random.choice(prefixes)} {result}"
+
+EFFECT = Effect("robot", robot_text, expansion=(4.0, 20))
@@ -0,0 +1,25 @@
+import random
+from typing import Callable
+
+from effects.base import Effect, chance, entropy, TextProfile, TokenStage
+
+
+def sarcasm_quotes_text(text: str, profile: TextProfile | None = None) -> str:
+    """"Конечно" ты "очень" "умный\""""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    result = []
+    for word in words:
+        if len(word) > 2 and random.random() < 0.35:
+            result.append(f'"{word}"')
+        else:
+            result.append(word)
+    return " ".join(result)
+
+SARCASM_CHANCE = chance(0.35)
+
+def sarcasm_stage(profile: TextProfile) -> Callable[[str], str]:
+    rolls = iter(entropy(len(profile.words)))
+    return lambda word: f'"{word}"' if next(rolls) < SARCASM_CHANCE and len(word) > 2 else word
+
+EFFECT = Effect("sarcasm_quotes", sarcasm_quotes_text, stage=TokenStage(sarcasm_stage), expansion=(2.0, 1))
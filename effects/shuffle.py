@@ -0,0 +1,13 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+def shuffle_words(text: str, profile: TextProfile | None = None) -> str:
+    """Перемешивает слова"""
+    profile = profile or TextProfile(text)
+    words = list(profile.words)
+    random.shuffle(words)
+    return " ".join(words)
+
+EFFECT = Effect("shuffle", shuffle_words)
@@ -0,0 +1,7 @@
+"""Slowmode в канале, длительность берётся из wizard.effects.slowmode"""
+
+from effects.base import Effect
+
+
+# Slowmode обрабатывается Discord'ом
+EFFECT = Effect("slowmode", needs_webhook=False, needs_delete=False, send=None, slowmode=True)
@@ -0,0 +1,42 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+def snake_text(text: str, profile: TextProfile | None = None) -> str:
+    """Шшшипение сссловами - русский и английский"""
+    profile = profile or TextProfile(text)
+    result = []
+    for word in profile.words:
+        if not word:
+            continue
+        first = word[0].lower()
+        # Английские шипящие
+        if first == 's':
+            word = 'sss' + word[1:]
+        elif first in 'cz':
+            word = word[0] + 'ss' + word[1:]
+        # Русские шипящие
+        elif first == 'с':
+            word = 'ссс' + word[1:]
+        elif first == 'ш':
+            word = 'шшш' + word[1:]
+        elif first == 'щ':
+            word = 'щщщ' + word[1:]
+        elif first == 'ж':
+            word = 'жжж' + word[1:]
+        elif first == 'з':
+            word = 'ззз' + word[1:]
+        elif first == 'ч':
+            word = 'ччч' + word[1:]
+        
+        if random.random() < 0.2:
+            # Добавляем шипение в конец
+            if any(c in word.lower() for c in 'сшщзж'):
+                word = word + "ссс"
+            elif any(c in word.lower() for c in 'szc'):
+                word = word + "sss"
+        result.append(word)
+    return " ".join(result)
+
+EFFECT = Effect("snake", snake_text, expansion=(3.5, 3), cost=0.3)
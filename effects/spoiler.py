@@ -0,0 +1,10 @@
+from effects.base import Effect, TextProfile, word_stage
+
+
+def spoiler_text(text: str, profile: TextProfile | None = None) -> str:
+    """||Каждое|| ||слово|| ||спойлер||"""
+    profile = profile or TextProfile(text)
+    words = profile.words
+    return " ".join(f"||{word}||" for word in words)
+
+EFFECT = Effect("spoiler", spoiler_text, stage=word_stage(lambda w: f"||{w}||"), expansion=(3.0, 2), deterministic=True)
@@ -0,0 +1,14 @@
+from effects.base import Effect, is_letter, TextProfile, word_stage
+
+
+def stutter_word(word: str) -> str:
+    if len(word) > 1 and is_letter(word[0]):
+        return f"{word[0]}-{word}"
+    return word
+
+def stutter_text(text: str, profile: TextProfile | None = None) -> str:
+    """З-заикание для русского и английского"""
+    profile = profile or TextProfile(text)
+    return " ".join(map(stutter_word, profile.words))
+
+EFFECT = Effect("stutter", stutter_text, stage=word_stage(stutter_word), expansion=(2.0, 1), deterministic=True)
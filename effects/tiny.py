@@ -0,0 +1,33 @@
+from effects.base import Effect, compile_char_map, TextProfile, word_stage
+
+
+TINY_TABLE = compile_char_map({
+    # Латиница
+    'a': 'ᵃ', 'b': 'ᵇ', 'c': 'ᶜ', 'd': 'ᵈ', 'e': 'ᵉ', 'f': 'ᶠ', 'g': 'ᵍ',
+    'h': 'ʰ', 'i': 'ⁱ', 'j': 'ʲ', 'k': 'ᵏ', 'l': 'ˡ', 'm': 'ᵐ', 'n': 'ⁿ',
+    'o': 'ᵒ', 'p': 'ᵖ', 'q': 'q', 'r': 'ʳ', 's': 'ˢ', 't': 'ᵗ', 'u': 'ᵘ',
+    'v': 'ᵛ', 'w': 'ʷ', 'x': 'ˣ', 'y': 'ʸ', 'z': 'ᶻ',
+    'A': 'ᴬ', 'B': 'ᴮ', 'C': 'ᶜ', 'D': 'ᴰ', 'E': 'ᴱ', 'F': 'ᶠ', 'G': 'ᴳ',
+    'H': 'ᴴ', 'I': 'ᴵ', 'J': 'ᴶ', 'K': 'ᴷ', 'L': 'ᴸ', 'M': 'ᴹ', 'N': 'ᴺ',
+    'O': 'ᴼ', 'P': 'ᴾ', 'Q': 'Q', 'R': 'ᴿ', 'S': 'ˢ', 'T': 'ᵀ', 'U': 'ᵁ',
+    'V': 'ⱽ', 'W': 'ᵂ', 'X': 'ˣ', 'Y': 'ʸ', 'Z': 'ᶻ',
+    # Кириллица (используем похожие символы где возможно)
+    'а': 'ᵃ', 'б': 'ᵇ', 'в': 'ᵛ', 'г': 'ᵍ', 'д': 'ᵈ', 'е': 'ᵉ', 'ё': 'ᵉ',
+    'ж': 'ж', 'з': 'ᶻ', 'и': 'ⁱ', 'й': 'ⁱ', 'к': 'ᵏ', 'л': 'ˡ', 'м': 'ᵐ',
+    'н': 'ⁿ', 'о': 'ᵒ', 'п': 'ᵖ', 'р': 'ʳ', 'с': 'ᶜ', 'т': 'ᵗ', 'у': 'ʸ',
+    'ф': 'ᶠ', 'х': 'ˣ', 'ц': 'ᶜ', 'ч': 'ᶜ', 'ш': 'ш', 'щ': 'щ', 'ъ': 'ъ',
+    'ы': 'ʸ', 'ь': 'ь', 'э': 'ᵉ', 'ю': 'ю', 'я': 'ʸ',
+    'А': 'ᴬ', 'Б': 'ᴮ', 'В': 'ⱽ', 'Г': 'ᴳ', 'Д': 'ᴰ', 'Е': 'ᴱ', 'Ё': 'ᴱ',
+    'Ж': 'Ж', 'З': 'ᶻ', 'И': 'ᴵ', 'Й': 'ᴵ', 'К': 'ᴷ', 'Л': 'ᴸ', 'М': 'ᴹ',
+    'Н': 'ᴺ', 'О': 'ᴼ', 'П': 'ᴾ', 'Р': 'ᴿ', 'С': 'ᶜ', 'Т': 'ᵀ', 'У': 'ʸ',
+    'Ф': 'ᶠ', 'Х': 'ˣ', 'Ц': 'ᶜ', 'Ч': 'ᶜ', 'Ш': 'Ш', 'Щ': 'Щ', 'Ъ': 'Ъ',
+    'Ы': 'ʸ', 'Ь': 'Ь', 'Э': 'ᴱ', 'Ю': 'Ю', 'Я': 'ʸ',
+})
+
+def tiny_text(text: str, profile: TextProfile | None = None) -> str:
+    """Маленькие буквы (надстрочные)"""
+    return text.translate(TINY_TABLE)
+
+EFFECT = Effect(
+    "tiny", tiny_text, stage=word_stage(lambda w: w.translate(TINY_TABLE), splits=False), deterministic=True
+)
@@ -0,0 +1,27 @@
+import random
+
+from effects.base import Effect, compile_char_map, compile_substitutions, TextProfile
+
+
+UWU_TABLE = compile_char_map({
+    # Английские замены
+    "r": "w", "R": "W", "l": "w", "L": "W",
+    # Русские замены
+    "р": "в", "Р": "В", "л": "в", "Л": "В",
+    "ш": "с", "Ш": "С", "щ": "с", "Щ": "С", "ж": "з", "Ж": "З",
+})
+UWU_DIGRAPHS = compile_substitutions({"th": "d", "Th": "D", "TH": "D"})
+UWU_FACES = ("UwU", "OwO", ">w<", "^w^", "~w~", ":3", "x3", "нян~", "ня~")
+
+def uwu_text(text: str, profile: TextProfile | None = None) -> str:
+    """UwU фикация для русского и английского"""
+    text = UWU_DIGRAPHS(text.translate(UWU_TABLE))
+
+    if random.random() < 0.3:
+        text = f"{random.choice(UWU_FACES)} {text}"
+    if random.random() < 0.3:
+        text = f"{text} {random.choice(UWU_FACES)}"
+
+    return text
+
+EFFECT = Effect("uwu", uwu_text, expansion=(1.0, 10))
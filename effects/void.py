@@ -0,0 +1,14 @@
+import random
+
+from effects.base import Effect, TextProfile
+
+
+VOID_SYMBOLS = (".", "·", "•", "。", "॰", "᛫")
+
+def void_text(text: str, profile: TextProfile | None = None) -> str:
+    """р а з р я д к а"""
+    spaced = " ".join(text)
+    symbol = random.choice(VOID_SYMBOLS)
+    return f"{symbol}  {spaced}  {symbol}"
+
+EFFECT = Effect("void", void_text, expansion=(2.0, 5))
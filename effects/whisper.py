@@ -0,0 +1,6 @@
+"""*шёпот строчными*"""
+
+from effects.base import Effect
+
+
+EFFECT = Effect("whisper", lambda t, p=None: f"*{t.lower()}*", expansion=(2.0, 2), deterministic=True)
@@ -0,0 +1,21 @@
+import random
+from typing import Callable
+
+from effects.base import Effect, entropy, ENTROPY_BITS, TextProfile, TokenStage
+
+
+def yell_text(text: str, profile: TextProfile | None = None) -> str:
+    """КРИК!!! С ВОСКЛИЦАНИЯМИ!!!"""
+    text = text.upper()
+    words = text.split()
+    result = []
+    for word in words:
+        exclamations = "!" * random.randint(1, 3)
+        result.append(word + exclamations)
+    return " ".join(result)
+
+def yell_stage(profile: TextProfile) -> Callable[[str], str]:
+    rolls = iter(entropy(len(profile.words)))
+    return lambda word: word.upper() + "!" * (1 + (next(rolls) * 3 >> ENTROPY_BITS))
+
+EFFECT = Effect("yell", yell_text, stage=TokenStage(yell_stage), expansion=(4.5, 2), cost=0.25)
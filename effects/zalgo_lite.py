@@ -0,0 +1,7 @@
+"""Тот же залго, что у glitch, под своим именем"""
+
+from effects.base import Effect
+from effects.glitch import glitch_text
+
+
+EFFECT = Effect("zalgo_lite", glitch_text, expansion=(4.0, 0), cost=0.8)
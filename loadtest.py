@@ -0,0 +1,438 @@
+"""Нагрузочный прогон эффектов колдуна без Discord.
+
+Поднимает локальный фейковый HTTP API Discord (сообщения, удаления,
+вебхуки, окна лимитов и 429 с настраиваемой задержкой) в отдельном
+потоке, направляет на него discord.py через Route.BASE и кормит настоящие
+обработчики main.py событиями MESSAGE_CREATE прямо в ConnectionState - как
+будто их прислал гейтвей. В конце печатает задержку от события до
+завершения репоста, число запросов к API на сообщение и лаг цикла событий.
+Сеть и токен не нужны.
+
+    python loadtest.py --effect caps --messages 5000 --rate 2000 --route-limit 0
+    python loadtest.py --effect uwu --latency 40 --jitter 20 --p429 0.02
+    python loadtest.py --effect reverse --webhook-limit 5 --webhook-window 2
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from typing import Callable
+
+from aiohttp import web
+import discord
+
+import main
+
+GUILD_ID = main.GUILD_ID
+CHANNEL_ID = main.GUILDS[GUILD_ID].wizard_channel
+ANONYMOUS_ID = main.GUILDS[GUILD_ID].anonymous_channel
+BOT_USER_ID = 100
+TOKEN = "loadtest.token"
+
+
+def reply(data, status: int = 200, headers: dict | None = None) -> web.Response:
+    """JSON-ответ; discord.py разбирает тело только при content-type ровно application/json"""
+    return web.Response(
+        body=json.dumps(data).encode(), status=status, headers={"Content-Type": "application/json", **(headers or {})}
+    )
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FakeDiscord:
+    """Минимальный REST API Discord в памяти: ровно то, что трогает бот"""
+
+    def __init__(
+        self, latency: float, jitter: float, p429: float, route_limit: int, webhook_limit: int, webhook_window: float
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.p429 = p429
+        self.route_limit = route_limit
+        self.webhook_limit = webhook_limit
+        self.webhook_window = webhook_window
+        self.ids = itertools.count(10**17)
+        self.webhooks: dict[int, dict] = {}
+        self.buckets: dict[str, collections.deque] = {}
+        self.calls: collections.Counter = collections.Counter()
+        self.throttled: collections.Counter = collections.Counter()
+        self.inflight: collections.Counter = collections.Counter()
+        self.peak: collections.Counter = collections.Counter()
+
+        self.app = web.Application()
+        self.app.router.add_get("/api/v10/users/@me", self.me)
+        self.app.router.add_get("/api/v10/channels/{channel}/webhooks", self.list_webhooks)
+        self.app.router.add_post("/api/v10/channels/{channel}/webhooks", self.create_webhook)
+        self.app.router.add_post("/api/v10/channels/{channel}/messages", self.create_message)
+        self.app.router.add_delete("/api/v10/channels/{channel}/messages/{message}", self.delete_message)
+        self.app.router.add_post("/api/v10/channels/{channel}/messages/bulk-delete", self.bulk_delete)
+        self.app.router.add_patch("/api/v10/channels/{channel}", self.edit_channel)
+        self.app.router.add_post("/api/v10/webhooks/{webhook}/{token}", self.execute_webhook)
+
+    async def _answer(self, kind: str, key: str, limit: int, window: float) -> tuple[web.Response | None, dict]:
+        """Задержка сети, окно лимита на key и случайный 429.
+
+        Возвращает готовый ответ 429 либо None и заголовки X-RateLimit-* для
+        штатного ответа: без них discord.py считает лимит маршрута равным
+        одному запросу и выстраивает все запросы в очередь.
+        """
+        self.calls[kind] += 1
+        self.inflight[kind] += 1
+        self.peak[kind] = max(self.peak[kind], self.inflight[kind])
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self.inflight[kind] -= 1
+        if self.p429 and random.random() < self.p429:
+            return self._too_many(kind, 0.05), {}
+        if not limit:
+            return None, {"X-RateLimit-Bucket": kind, "X-RateLimit-Limit": "1000",
+                          "X-RateLimit-Remaining": "999", "X-RateLimit-Reset-After": "1.000"}
+
+        now = time.monotonic()
+        bucket = self.buckets.setdefault(key, collections.deque())
+        while bucket and bucket[0] <= now - window:
+            bucket.popleft()
+        if len(bucket) >= limit:
+            return self._too_many(kind, bucket[0] + window - now), {}
+        bucket.append(now)
+        return None, {
+            "X-RateLimit-Bucket": kind,
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(limit - len(bucket)),
+            "X-RateLimit-Reset-After": f"{bucket[0] + window - now:.3f}",
+        }
+
+    async def _route(self, kind: str, channel: str) -> tuple[web.Response | None, dict]:
+        return await self._answer(kind, f"{kind}:{channel}", self.route_limit, 1.0)
+
+    def _too_many(self, kind: str, retry_after: float) -> web.Response:
+        self.throttled[kind] += 1
+        return reply(
+            {"message": "You are being rate limited.", "retry_after": retry_after, "global": False},
+            status=429,
+            headers={
+                "Retry-After": f"{retry_after:.3f}",
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset-After": f"{retry_after:.3f}",
+                "X-RateLimit-Scope": "user",
+                # без Via discord.py принимает 429 за бан Cloudflare и не ретраит
+                "Via": "1.1 google",
+            },
+        )
+
+    def _message(self, channel_id: int, content: str = "", embeds: list | None = None, webhook_id: int | None = None) -> dict:
+        author_id = webhook_id or BOT_USER_ID
+        return {
+            "id": str(next(self.ids)),
+            "channel_id": str(channel_id),
+            "author": {"id": str(author_id), "username": "fake", "discriminator": "0000", "avatar": None},
+            "content": content,
+            "embeds": embeds or [],
+            "attachments": [],
+            "mentions": [],
+            "mention_roles": [],
+            "mention_everyone": False,
+            "pinned": False,
+            "tts": False,
+            "type": 0,
+            "flags": 0,
+            "timestamp": "2024-01-01T00:00:00+00:00",
+            "edited_timestamp": None,
+            **({"webhook_id": str(webhook_id)} if webhook_id else {}),
+        }
+
+    async def me(self, request: web.Request) -> web.Response:
+        return reply(
+            {"id": str(BOT_USER_ID), "username": "toxicity", "discriminator": "0000", "avatar": None, "bot": True}
+        )
+
+    async def list_webhooks(self, request: web.Request) -> web.Response:
+        resp, headers = await self._route("list_webhooks", request.match_info["channel"])
+        if resp is not None:
+            return resp
+        channel_id = request.match_info["channel"]
+        return reply([w for w in self.webhooks.values() if w["channel_id"] == channel_id], headers=headers)
+
+    async def create_webhook(self, request: web.Request) -> web.Response:
+        resp, headers = await self._route("create_webhook", request.match_info["channel"])
+        if resp is not None:
+            return resp
+        body = await request.json()
+        webhook_id = next(self.ids)
+        data = {
+            "id": str(webhook_id),
+            "type": 1,
+            "name": body["name"],
+            "token": f"token{webhook_id}",
+            "channel_id": request.match_info["channel"],
+            "guild_id": str(GUILD_ID),
+            "avatar": None,
+        }
+        self.webhooks[webhook_id] = data
+        return reply(data, headers=headers)
+
+    async def create_message(self, request: web.Request) -> web.Response:
+        resp, headers = await self._route("channel_send", request.match_info["channel"])
+        if resp is not None:
+            return resp
+        body = await request.json()
+        return reply(
+            self._message(int(request.match_info["channel"]), body.get("content") or "", body.get("embeds")),
+            headers=headers,
+        )
+
+    async def delete_message(self, request: web.Request) -> web.Response:
+        resp, headers = await self._route("delete", request.match_info["channel"])
+        if resp is not None:
+            return resp
+        return web.Response(status=204, headers=headers)
+
+    async def bulk_delete(self, request: web.Request) -> web.Response:
+        resp, headers = await self._route("bulk_delete", request.match_info["channel"])
+        if resp is not None:
+            return resp
+        return web.Response(status=204, headers=headers)
+
+    async def edit_channel(self, request: web.Request) -> web.Response:
+        resp, headers = await self._route("edit_channel", request.match_info["channel"])
+        if resp is not None:
+            return resp
+        return reply(channel_payload(int(request.match_info["channel"])), headers=headers)
+
+    async def execute_webhook(self, request: web.Request) -> web.Response:
+        webhook = request.match_info["webhook"]
+        resp, headers = await self._answer("webhook_send", webhook, self.webhook_limit, self.webhook_window)
+        if resp is not None:
+            return resp
+        body = await request.json()
+        return reply(
+            self._message(CHANNEL_ID, body.get("content") or "", body.get("embeds"), int(webhook)), headers=headers
+        )
+
+
+def serve(fake: FakeDiscord) -> tuple[int, Callable[[], None]]:
+    """Поднимает фейковый API в отдельном потоке со своим циклом событий,
+    чтобы его работа не попадала в замер лага цикла бота"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    ports = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(fake.app, access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        loop.run_until_complete(site.start())
+        ports.append(site._server.sockets[0].getsockname()[1])
+        ready.set()
+        loop.run_forever()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+    thread = threading.Thread(target=run, name="fake-discord", daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return ports[0], stop
+
+
+def channel_payload(channel_id: int) -> dict:
+    return {
+        "id": str(channel_id),
+        "type": 0,
+        "guild_id": str(GUILD_ID),
+        "name": f"channel-{channel_id}",
+        "position": 0,
+        "permission_overwrites": [],
+        "rate_limit_per_user": 0,
+        "nsfw": False,
+        "topic": None,
+        "last_message_id": None,
+    }
+
+
+def inject_guild(state):
+    """Сервер с каналом колдуна и анонимным каналом, как после GUILD_CREATE"""
+    data = {
+        "id": str(GUILD_ID),
+        "name": "loadtest",
+        "owner_id": str(BOT_USER_ID),
+        "roles": [{
+            "id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0,
+            "color": 0, "hoist": False, "managed": False, "mentionable": False,
+        }],
+        "channels": [channel_payload(CHANNEL_ID), channel_payload(ANONYMOUS_ID)],
+        "members": [],
+        "member_count": 1,
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+    }
+    state._add_guild(discord.Guild(data=data, state=state))
+
+
+async def watch_lag(samples: list[float], interval: float = 0.01):
+    """Насколько позже положенного просыпается цикл событий"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+async def run(args) -> int:
+    if args.effect not in main.EFFECTS or main.EFFECTS[args.effect].send is None:
+        print(f"Effect {args.effect!r} does not repost messages", file=sys.stderr)
+        return 2
+
+    fake = FakeDiscord(
+        args.latency / 1000, args.jitter / 1000, args.p429, args.route_limit, args.webhook_limit, args.webhook_window
+    )
+    port, stop = serve(fake)
+    # вебхуки discord.py берут тот же Route, так что хватает одной подмены
+    discord.http.Route.BASE = f"http://127.0.0.1:{port}/api/v10"
+
+    bot = main.bot
+    state = bot._connection
+    bot.loop = asyncio.get_running_loop()
+    state.user = discord.ClientUser(state=state, data=await bot.http.static_login(TOKEN))
+    inject_guild(state)
+
+    wizard = main.wizards[CHANNEL_ID]
+    wizard.active = args.effect
+    wizard.phase = main.WizardState.ACTIVE
+
+    sent_at: dict[int, float] = {}
+    latencies: list[float] = []
+    finished = asyncio.Event()
+    handler = bot.on_message
+
+    async def traced(message: discord.Message):
+        try:
+            await handler(message)
+        finally:
+            start = sent_at.pop(message.id, None)
+            if start is not None:
+                latencies.append(time.perf_counter() - start)
+            if len(latencies) >= args.messages:
+                finished.set()
+
+    bot.on_message = traced
+
+    lag: list[float] = []
+    lag_task = asyncio.create_task(watch_lag(lag))
+    words = ("hello", "world", "привет", "колдун", "опять", "lol", "what", "дела", "🔥", "bro")
+    message_ids = itertools.count(10**18)
+    # фиксированный набор строк - флуд копипастой, иначе каждая строка случайная
+    lines = [" ".join(random.choices(words, k=args.words)) for _ in range(args.lines)]
+
+    start = time.perf_counter()
+    for i in range(args.messages):
+        if args.rate:
+            ahead = start + i / args.rate - time.perf_counter()
+            if ahead > 0.001:
+                await asyncio.sleep(ahead)
+        elif i % 100 == 0:
+            await asyncio.sleep(0)
+        message_id = next(message_ids)
+        author_id = 1000 + i % args.authors
+        sent_at[message_id] = time.perf_counter()
+        state.parse_message_create({
+            "id": str(message_id),
+            "channel_id": str(CHANNEL_ID),
+            "guild_id": str(GUILD_ID),
+            "author": {"id": str(author_id), "username": f"user{author_id}", "discriminator": "0000", "avatar": None},
+            "content": lines[i % len(lines)] if lines else " ".join(random.choices(words, k=args.words)),
+            "embeds": [],
+            "attachments": [],
+            "mentions": [],
+            "mention_roles": [],
+            "mention_everyone": False,
+            "pinned": False,
+            "tts": False,
+            "type": 0,
+            "timestamp": "2024-01-01T00:00:00+00:00",
+            "edited_timestamp": None,
+        })
+    injected = time.perf_counter() - start
+
+    try:
+        await asyncio.wait_for(finished.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        print(f"Timed out: {len(latencies)}/{args.messages} messages handled", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    # отложенные эффекты (delay, double) и склеенный флуд дописывают уже после обработчика
+    await main.delayed_sends.drain(args.timeout)
+    quiet = 0
+    while quiet < 3:
+        await asyncio.sleep(0.1)
+        busy = main.flood.held or sum(main.queue_depths().values()) or sum(fake.inflight.values())
+        quiet = 0 if busy else quiet + 1
+    lag_task.cancel()
+
+    handled = len(latencies) or 1
+    print(f"effect {args.effect}: {len(latencies)} messages, injected in {injected:.2f}s, handled in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} msg/s)")
+    print("end-to-end ms:  " + "  ".join(
+        f"p{int(q * 100)}={percentile(latencies, q) * 1000:.1f}" for q in (0.5, 0.9, 0.99)
+    ) + f"  max={max(latencies, default=0) * 1000:.1f}")
+    print("loop lag ms:    " + "  ".join(
+        f"p{int(q * 100)}={percentile(lag, q) * 1000:.1f}" for q in (0.5, 0.99)
+    ) + f"  max={max(lag, default=0) * 1000:.1f}")
+    total = sum(fake.calls.values())
+    print(f"API calls/msg:  {total / handled:.2f}  " + "  ".join(
+        f"{kind}={count / handled:.2f}" for kind, count in sorted(fake.calls.items())
+    ))
+    print("peak in flight: " + "  ".join(f"{kind}={count}" for kind, count in sorted(fake.peak.items())))
+    if fake.throttled:
+        print("429 served:     " + "  ".join(f"{kind}={count}" for kind, count in sorted(fake.throttled.items())))
+    hits = main.metrics.counters.get("rate_limit_hits", {})
+    print(f"rate limit hits seen by the bot: {sum(hits.values()):g}  " + "  ".join(
+        f"{dict(labels)['route']}={count:g}" for labels, count in sorted(hits.items())
+    ))
+
+    await bot.http.close()
+    stop()
+    return 0
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Offline load test against a fake Discord API")
+    parser.add_argument("--effect", default="caps", help="wizard effect to keep active")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=1000, help="messages per second, 0 - as fast as possible")
+    parser.add_argument("--authors", type=int, default=50, help="distinct message authors")
+    parser.add_argument("--words", type=int, default=12, help="words per message")
+    parser.add_argument("--lines", type=int, default=0, help="distinct message texts to cycle through, 0 - all random")
+    parser.add_argument("--latency", type=float, default=20, help="fake API latency, ms")
+    parser.add_argument("--jitter", type=float, default=5, help="latency jitter, ms")
+    parser.add_argument("--p429", type=float, default=0.0, help="probability of a random 429")
+    parser.add_argument("--route-limit", type=int, default=50, help="requests per route and channel per second, 0 - unlimited")
+    parser.add_argument("--webhook-limit", type=int, default=0, help="sends per webhook per window, 0 - unlimited")
+    parser.add_argument("--webhook-window", type=float, default=2.0, help="webhook rate limit window, s")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
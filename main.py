@@ -1,3 +1,5 @@
+import aiohttp
+from aiohttp import web
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
@@ -6,801 +8,1995 @@ import time
 import asyncio
 import yaml
 import logging
-import traceback
+import logging.handlers
+import queue
+import atexit
 import re
 import os
+import signal
+import itertools
+import heapq
+import collections
+import bisect
+import functools
+import math
+import unicodedata
+import sqlite3
+import hashlib
+import json
+import marshal
+import sys
+import types
+import dataclasses
+import concurrent.futures
+from dataclasses import dataclass
+from typing import Callable
+
+from effects import EffectRegistry
+from effects.base import Effect, TextProfile
 
 # ==================== логирование ====================
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("bot.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+LOG_PATH = "bot.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+LOG_ROTATE_SECONDS = 24 * 60 * 60
+LOG_QUEUE_SIZE = 10_000
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RotatingLogHandler(logging.handlers.RotatingFileHandler):
+    """Ротация по размеру и не реже чем раз в interval секунд"""
+
+    def __init__(self, path: str, max_bytes: int, backups: int, interval: float):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        return time.time() >= self.rollover_at or super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Кладёт записи в очередь как есть, всё остальное - в потоке слушателя.
+
+    Стандартный prepare() форматирует сообщение и traceback прямо в вызывающем
+    потоке, то есть в цикле событий - здесь этого нет. Очередь ограничена:
+    при шторме лишние записи выбрасываются и считаются, а не копятся в памяти
+    и не тормозят обработку сообщений.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.reported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped != self.reported:
+            lost, self.reported = self.dropped - self.reported, self.dropped
+            warning = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                "Log queue overflow: %s records dropped", (lost,), None,
+            )
+            try:
+                self.queue.put_nowait(warning)
+            except queue.Full:
+                pass
+
+
+class LogListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # при выключении ждём, пока поток разгребёт полную очередь, а не падаем
+        self.queue.put(self._sentinel)
+
+
+log_file = RotatingLogHandler(LOG_PATH, LOG_MAX_BYTES, LOG_BACKUPS, LOG_ROTATE_SECONDS)
+log_file.setFormatter(JsonFormatter())
+log_console = logging.StreamHandler()
+log_console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+
+log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+log_handler = LazyQueueHandler(log_queue)
+log_listener = LogListener(log_queue, log_file, log_console, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logging.basicConfig(level=logging.INFO, handlers=[log_handler])
 logger = logging.getLogger(__name__)
 
 # ==================== загрузка конфига ====================
 
+CONFIG_PATH = "config.yml"
+CONFIG_CACHE = ".config.cache"
+CONFIG_CACHE_VERSION = 2
+
+# libyaml на порядок быстрее чистого питона, но есть не везде
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+NUMBER = (int, float)
+
+# ключ с "?" необязателен; dict - любой словарь, [схема] - список элементов
+CONFIG_SCHEMA = {
+    "bot": {"token": str, "prefix": str},
+    "guild": {"id": int},
+    "guilds?": dict,
+    "channels": {"anonymous_messages": int, "wizard_channel": int},
+    "roles": {"prison_staff": int, "prisoner": int},
+    "cooldowns": {"send_seconds": NUMBER},
+    "storage": {"path": str},
+    "webhooks": {
+        "name": str,
+        "pool_size": int,
+        "queue_warn_depth": int,
+        "max_length": int,
+        "overflow": str,
+        "max_parts": int,
+        "repost_policy": str,
+    },
+    "commands": {
+        "send": {"name": str, "description": str, "option_description": str},
+        "prison": {
+            "name": str,
+            "description": str,
+            "option_description": str,
+            "reason_description": str,
+            "others_description": str,
+        },
+        "release": {"name": str, "description": str, "option_description": str, "others_description": str},
+    },
+    "prison": {"concurrency": int, "max_targets": int},
+    "anonymous": {"window_seconds": NUMBER, "max_latency_seconds": NUMBER, "max_pending": int},
+    "flood": {"window_seconds": NUMBER, "max_latency_seconds": NUMBER, "max_authors": int},
+    "messages": dict,
+    "embed_colors": [int],
+    "metrics?": {"host": str, "port": int, "summary_minutes": NUMBER},
+    "transform_cache?": {"size": int},
+    "transforms?": {"inline_us": NUMBER, "workers": int, "timeout_seconds": NUMBER},
+    "wizard": {
+        "interval_hours": NUMBER,
+        "duration_minutes": NUMBER,
+        "announcement_title": str,
+        "chaos?": {"chance": NUMBER, "stacks": [[str]]},
+        "effects": dict,
+        "messages": {"effect_ended": str, "anonymous_format": str},
+    },
+}
+
+
+class ConfigError(ValueError):
+    """Конфиг прочитался, но не сходится со схемой или сам с собой"""
+
+
+def check_schema(node, schema, path: str = "config") -> list[str]:
+    """Сверяет узел конфига со схемой, возвращает все найденные ошибки"""
+    if isinstance(schema, dict):
+        if not isinstance(node, dict):
+            return [f"{path}: expected a mapping"]
+        errors = []
+        for key, sub in schema.items():
+            name = key.rstrip("?")
+            if node.get(name) is None:
+                if not key.endswith("?"):
+                    errors.append(f"{path}.{name}: missing")
+                continue
+            errors += check_schema(node[name], sub, f"{path}.{name}")
+        return errors
+    if isinstance(schema, list):
+        if not isinstance(node, list):
+            return [f"{path}: expected a list"]
+        errors = []
+        for i, item in enumerate(node):
+            errors += check_schema(item, schema[0], f"{path}[{i}]")
+        return errors
+    # bool - тоже int, но в конфиге это почти всегда опечатка
+    if not isinstance(node, schema) or isinstance(node, bool):
+        return [f"{path}: expected {getattr(schema, '__name__', 'number')}, got {type(node).__name__}"]
+    return []
+
+
+def read_config(path: str) -> dict:
+    """Читает и проверяет конфиг.
+
+    Разобранный YAML кэшируется в marshal рядом с конфигом по хэшу файла:
+    пока config.yml не меняли, холодный старт обходится без YAML вовсе.
+    marshal, в отличие от pickle, только читает данные и не исполняет код
+    из файла; его формат зависит от версии питона, она входит в ключ.
+    Выведенные структуры (GuildConfig, стопки хаоса) не кэшируются -
+    они собираются из словаря быстрее, чем читается YAML.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    key = (CONFIG_CACHE_VERSION, marshal.version, sys.hexversion, hashlib.sha256(raw).hexdigest())
+
+    data = None
+    try:
+        with open(CONFIG_CACHE, "rb") as f:
+            cached_key, cached = marshal.load(f)
+        if cached_key == key and isinstance(cached, dict):
+            data = cached
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    from_cache = data is not None
+    if data is None:
+        data = yaml.load(raw, Loader=YAML_LOADER)
+
+    errors = check_schema(data, CONFIG_SCHEMA)
+    if errors:
+        raise ConfigError("; ".join(errors))
+
+    if not from_cache:
+        try:
+            # даты и прочие типы YAML вне marshal - тогда просто без кэша
+            payload = marshal.dumps((key, data))
+            with open(CONFIG_CACHE + ".tmp", "wb") as f:
+                f.write(payload)
+            os.replace(CONFIG_CACHE + ".tmp", CONFIG_CACHE)
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to write config cache: %s", e)
+    logger.info("Config loaded successfully (%s)", "cache" if from_cache else YAML_LOADER.__name__)
+    return data
+
+
 try:
-    with open("config.yml", "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
-    logger.info("Config loaded successfully")
+    config = read_config(CONFIG_PATH)
 except Exception as e:
-    logger.critical(f"Failed to load config: {e}")
+    logger.critical("Failed to load config: %s", e)
     exit(1)
 
 raw_env_token = os.getenv("BOT_TOKEN")
 
 if raw_env_token and raw_env_token.strip():
     BOT_TOKEN = raw_env_token.strip().strip('"').strip("'")
-    logger.info(f"Token loaded from ENV (length={len(BOT_TOKEN)}, starts={BOT_TOKEN[:10]}...)")
+    logger.info("Token loaded from ENV (length=%s, starts=%s...)", len(BOT_TOKEN), BOT_TOKEN[:10])
 else:
     BOT_TOKEN = config["bot"]["token"]
-    logger.info(f"Token loaded from config.yml (length={len(BOT_TOKEN)}, starts={BOT_TOKEN[:10]}...)")
+    logger.info("Token loaded from config.yml (length=%s, starts=%s...)", len(BOT_TOKEN), BOT_TOKEN[:10])
 
 PREFIX          = config["bot"]["prefix"]
 
 GUILD_ID        = config["guild"]["id"]
-CHANNEL_ID      = config["channels"]["anonymous_messages"]
-WIZARD_CHANNEL  = config["channels"]["wizard_channel"]
-
-STAFF_ROLE_ID   = config["roles"]["prison_staff"]
-PRISONER_ROLE   = config["roles"]["prisoner"]
 
-COOLDOWN        = config["cooldowns"]["send_seconds"]
-COLORS          = config["embed_colors"]
+COLORS          = tuple(config["embed_colors"])
 MSGS            = config["messages"]
 CMD             = config["commands"]
 WIZARD          = config["wizard"]
+WEBHOOKS        = config["webhooks"]
+STORAGE         = config["storage"]
+PRISON          = config["prison"]
+ANONYMOUS       = config["anonymous"]
+FLOOD           = config["flood"]
+METRICS         = config.get("metrics") or {"host": "127.0.0.1", "port": 0, "summary_minutes": 15}
+TRANSFORM_CACHE = config.get("transform_cache") or {"size": 4096}
+TRANSFORMS      = config.get("transforms") or {"inline_us": 500, "workers": 2, "timeout_seconds": 0.5}
+
+# ==================== серверы и шарды ====================
+
+@dataclass(frozen=True)
+class GuildConfig:
+    """Настройки одного сервера: базовые секции конфига плюс его оверлей.
+
+    Всё, что нужно при обработке сообщений, разобрано заранее в неизменяемые
+    поля, чтобы не ходить по словарям конфига на каждое сообщение.
+    """
+    id: int
+    anonymous_channel: int
+    wizard_channel: int
+    staff_role: int
+    prisoner_role: int
+    cooldown: float
+    effects: tuple[str, ...]
+    slowmode_seconds: types.MappingProxyType       # эффект -> задержка slowmode
+    delay_seconds: float
+    interval_hours: float
+    duration_minutes: float
+    announcement_title: str
+    effect_ended: str
+    anonymous_format: str
+    chaos_chance: float
+    chaos_stacks: tuple[tuple[str, ...], ...]
+
+
+def merge_config(base: dict, overlay: dict) -> dict:
+    """Накладывает оверлей на секцию конфига: словари сливаются, null удаляет ключ"""
+    merged = dict(base)
+    for key, value in overlay.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+GUILD_SECTIONS = ("channels", "roles", "cooldowns", "wizard")
+# параметры эффектов, которые сервер может переопределить; остальные живут
+# в общем реестре эффектов и берутся только из базовой секции wizard.effects
+GUILD_EFFECT_OPTIONS = ("slowmode_seconds", "delay_seconds")
+
+def build_guild(cfg: dict, guild_id: int, overlay: dict) -> GuildConfig:
+    section = merge_config({key: cfg[key] for key in GUILD_SECTIONS}, overlay)
+    errors = check_schema(section, {key: CONFIG_SCHEMA[key] for key in GUILD_SECTIONS}, f"guilds.{guild_id}")
+    if errors:
+        raise ConfigError("; ".join(errors))
+
+    wizard = section["wizard"]
+    effects = {name: params or {} for name, params in wizard["effects"].items()}
+    for name, params in effects.items():
+        base = cfg["wizard"]["effects"].get(name) or {}
+        changed = sorted(
+            key for key in params.keys() | base.keys()
+            if key not in GUILD_EFFECT_OPTIONS and params.get(key) != base.get(key)
+        )
+        if changed:
+            raise ConfigError(
+                f"guilds.{guild_id}.wizard.effects.{name}: {', '.join(changed)} cannot be set per guild, "
+                f"only {', '.join(GUILD_EFFECT_OPTIONS)}"
+            )
+    chaos = wizard.get("chaos") or {}
+    return GuildConfig(
+        id=guild_id,
+        anonymous_channel=section["channels"]["anonymous_messages"],
+        wizard_channel=section["channels"]["wizard_channel"],
+        staff_role=section["roles"]["prison_staff"],
+        prisoner_role=section["roles"]["prisoner"],
+        cooldown=section["cooldowns"]["send_seconds"],
+        effects=tuple(effects),
+        slowmode_seconds=types.MappingProxyType(
+            {name: params.get("slowmode_seconds", 30) for name, params in effects.items()}
+        ),
+        delay_seconds=effects.get("delay", {}).get("delay_seconds", 5),
+        interval_hours=wizard["interval_hours"],
+        duration_minutes=wizard["duration_minutes"],
+        announcement_title=wizard["announcement_title"],
+        effect_ended=wizard["messages"]["effect_ended"],
+        anonymous_format=wizard["messages"]["anonymous_format"],
+        chaos_chance=chaos.get("chance", 0.0),
+        chaos_stacks=tuple(tuple(stack) for stack in chaos.get("stacks", ())),
+    )
+
+
+def load_guilds(cfg: dict) -> dict[int, GuildConfig]:
+    default_id = cfg["guild"]["id"]
+    guilds = {default_id: build_guild(cfg, default_id, {})}
+    for guild_id, overlay in (cfg.get("guilds") or {}).items():
+        overlay = overlay or {}
+        # каналы у каждого сервера свои, наследовать их нельзя
+        if int(guild_id) != default_id and "channels" not in overlay:
+            raise ConfigError(f"Guild {guild_id} overlay must define its own channels")
+        guilds[int(guild_id)] = build_guild(cfg, int(guild_id), overlay)
+
+    wizard_channels = [g.wizard_channel for g in guilds.values()]
+    if len(set(wizard_channels)) != len(wizard_channels):
+        raise ConfigError("Each guild needs its own wizard channel")
+    return guilds
+
+
+def shard_options() -> dict:
+    """Шарды процесса из SHARD_COUNT и SHARD_IDS ("0,1" или "0-3").
+
+    Без них discord.py сам выбирает число шардов и держит все в одном
+    процессе. С ними серверы можно разложить по нескольким процессам:
+    каждый видит только сервера своих шардов.
+    """
+    count = os.getenv("SHARD_COUNT", "").strip()
+    ids = os.getenv("SHARD_IDS", "").strip()
+    if not count:
+        if ids:
+            logger.critical("SHARD_IDS requires SHARD_COUNT")
+            exit(1)
+        return {}
+
+    try:
+        shard_count = int(count)
+        shard_ids = []
+        for chunk in filter(None, ids.split(",")):
+            first, _, last = chunk.partition("-")
+            shard_ids.extend(range(int(first), int(last or first) + 1))
+    except ValueError:
+        logger.critical("Bad SHARD_COUNT/SHARD_IDS: %r / %r", count, ids)
+        exit(1)
+
+    if any(not 0 <= i < shard_count for i in shard_ids):
+        logger.critical("SHARD_IDS %s out of range for SHARD_COUNT %s", ids, shard_count)
+        exit(1)
+    logger.info("Shards: %s of %s", shard_ids or "all", shard_count)
+    return {"shard_count": shard_count, "shard_ids": shard_ids or None}
+
+
+try:
+    GUILDS = load_guilds(config)
+except ConfigError as e:
+    logger.critical("Invalid guild config: %s", e)
+    exit(1)
+
+# ==================== метрики ====================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Распределение задержек по фиксированным корзинам, как у Prometheus"""
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля - верхняя граница корзины, куда он попал"""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+class Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: Labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe_labels(self.name, time.perf_counter() - self.start, self.labels)
+        if exc_type is not None:
+            self.metrics.inc_labels(f"{self.name}_errors", self.labels)
+        return False
+
+
+class Metrics:
+    """Счётчики, гистограммы задержек и гейджи в памяти процесса.
+
+    Запись - пара операций со словарём, без блокировок: всё пишется из
+    цикла событий. Гейджи считаются только при чтении, через колбэки.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+        self.gauges: dict[str, Callable[[], dict[Labels, float]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.inc_labels(name, tuple(sorted(labels.items())), value)
+
+    def inc_labels(self, name: str, labels: Labels, value: float = 1):
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def observe_labels(self, name: str, seconds: float, labels: Labels):
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(seconds)
+
+    def timer(self, name: str, **labels) -> Timer:
+        """with metrics.timer("webhook_send"): ... - задержка, число вызовов и ошибок"""
+        return Timer(self, name, tuple(sorted(labels.items())))
+
+    def timed(self, name: str):
+        """Декоратор корутины для timer()"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with Timer(self, name, ()):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def gauge(self, name: str, read: Callable[[], dict[Labels, float] | float]):
+        self.gauges[name] = read
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        for name, series in self.counters.items():
+            full = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {full} counter")
+            lines += [f"{full}{format_labels(labels)} {value:g}" for labels, value in series.items()]
+        for name, series in self.histograms.items():
+            full = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {full} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + (math.inf,), histogram.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == math.inf else f"{bound:g}"
+                    lines.append(f"{full}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{full}_sum{format_labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{full}_count{format_labels(labels)} {histogram.count}")
+        for name, read in self.gauges.items():
+            full = f"{self.prefix}_{name}"
+            values = read()
+            if not isinstance(values, dict):
+                values = {(): values}
+            lines.append(f"# TYPE {full} gauge")
+            lines += [f"{full}{format_labels(labels)} {value:g}" for labels, value in values.items()]
+        return "\n".join(lines) + "\n"
+
+    def summary(self, top: int = 8) -> str:
+        """Самые тяжёлые по суммарному времени операции - для лога"""
+        rows = [
+            (histogram.total, name, labels, histogram)
+            for name, series in self.histograms.items()
+            for labels, histogram in series.items()
+            if histogram.count
+        ]
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return "; ".join(
+            f"{name}{format_labels(labels)} n={h.count} avg={h.total / h.count * 1000:.1f}ms "
+            f"p95<={h.quantile(0.95) * 1000:g}ms"
+            for _, name, labels, h in rows[:top]
+        )
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+metrics = Metrics("toxicity")
+metrics.gauge("log_records_dropped", lambda: log_handler.dropped)
+
+
+# ==================== хранилище ====================
+
+db = sqlite3.connect(STORAGE["path"])
+db.execute("PRAGMA journal_mode=WAL")
+db.execute("PRAGMA synchronous=NORMAL")
+with db:
+    db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+
+def kv_get(key: str) -> str | None:
+    row = db.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def kv_set(key: str, value: str):
+    with db:
+        db.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, value))
+
+
+def migrate_cooldowns(conn: sqlite3.Connection):
+    """Старая таблица кулдаунов без guild_id - все записи относятся к основному серверу"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(cooldowns)")]
+    if columns and "guild_id" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE cooldowns RENAME TO cooldowns_v1")
+            conn.execute(
+                "CREATE TABLE cooldowns (guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, PRIMARY KEY (guild_id, user_id))"
+            )
+            conn.execute(
+                "INSERT INTO cooldowns (guild_id, user_id, expires_at) SELECT ?, user_id, expires_at FROM cooldowns_v1",
+                (GUILD_ID,),
+            )
+            conn.execute("DROP TABLE cooldowns_v1")
+        logger.info("Cooldowns table migrated to per-guild keys")
+
+migrate_cooldowns(db)
+
+
+class CooldownStore:
+    """Кулдауны /send одного сервера: в памяти только активные, на диске - каждое изменение.
+
+    Истёкшие записи вытесняются через кучу по времени окончания, поэтому
+    память растёт с числом активных кулдаунов, а не со всеми, кто когда-либо
+    писал. Время настенное - его переживает рестарт.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, guild_id: int, seconds: float):
+        self.conn = conn
+        self.guild_id = guild_id
+        self.seconds = seconds
+        self.expiry: dict[int, float] = {}
+        self.heap: list[tuple[float, int]] = []
+
+        now = time.time()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cooldowns (guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, PRIMARY KEY (guild_id, user_id))"
+            )
+            conn.execute("DELETE FROM cooldowns WHERE guild_id = ? AND expires_at <= ?", (guild_id, now))
+        for user_id, expires_at in conn.execute(
+            "SELECT user_id, expires_at FROM cooldowns WHERE guild_id = ?", (guild_id,)
+        ):
+            self.expiry[user_id] = expires_at
+            self.heap.append((expires_at, user_id))
+        heapq.heapify(self.heap)
+
+    def __len__(self) -> int:
+        return len(self.expiry)
+
+    def remaining(self, user_id: int, now: float | None = None) -> float:
+        """Сколько секунд кулдауна осталось у пользователя (0 - свободен)"""
+        now = time.time() if now is None else now
+        self._evict(now)
+        expires_at = self.expiry.get(user_id)
+        return expires_at - now if expires_at is not None else 0.0
+
+    def start(self, user_id: int, now: float | None = None):
+        expires_at = (time.time() if now is None else now) + self.seconds
+        self.expiry[user_id] = expires_at
+        heapq.heappush(self.heap, (expires_at, user_id))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cooldowns (guild_id, user_id, expires_at) VALUES (?, ?, ?)",
+                (self.guild_id, user_id, expires_at),
+            )
+
+    def cancel(self, user_id: int):
+        """Снимает кулдаун, если попытка не удалась (в куче запись истечёт сама)"""
+        if self.expiry.pop(user_id, None) is not None:
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM cooldowns WHERE guild_id = ? AND user_id = ?", (self.guild_id, user_id)
+                )
+
+    def _evict(self, now: float):
+        evicted = False
+        while self.heap and self.heap[0][0] <= now:
+            expires_at, user_id = heapq.heappop(self.heap)
+            # в куче могут лежать устаревшие записи после повторного start
+            if self.expiry.get(user_id) == expires_at:
+                del self.expiry[user_id]
+                evicted = True
+        if evicted:
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM cooldowns WHERE guild_id = ? AND expires_at <= ?", (self.guild_id, now)
+                )
+
+
+class PrisonRegistry:
+    """Заключённые: номер, ник и роли до посадки - чтобы /release всё вернул.
+
+    Номера выдаются из битовой карты свободных номеров на сервер: поиск
+    начинается со случайного места и идёт до первого свободного бита, так что
+    номера не повторяются, пока человек сидит. Карта строится из таблицы при
+    первом обращении к серверу.
+    """
+
+    NUMBERS = 10000
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.bitmaps: dict[int, bytearray] = {}
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prisoners (guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+                "inmate_number INTEGER NOT NULL, nick TEXT, roles TEXT NOT NULL, imprisoned_at REAL NOT NULL, "
+                "PRIMARY KEY (guild_id, user_id))"
+            )
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS prisoners_number ON prisoners (guild_id, inmate_number)"
+            )
+
+    def _bitmap(self, guild_id: int) -> bytearray:
+        bits = self.bitmaps.get(guild_id)
+        if bits is None:
+            bits = self.bitmaps[guild_id] = bytearray((self.NUMBERS + 7) // 8)
+            # хвост последнего байта за пределами диапазона всегда занят
+            for number in range(self.NUMBERS, len(bits) * 8):
+                bits[number >> 3] |= 1 << (number & 7)
+            for (number,) in self.conn.execute(
+                "SELECT inmate_number FROM prisoners WHERE guild_id = ?", (guild_id,)
+            ):
+                bits[number >> 3] |= 1 << (number & 7)
+        return bits
+
+    def get(self, guild_id: int, user_id: int) -> tuple[int, str | None, list[int]] | None:
+        row = self.conn.execute(
+            "SELECT inmate_number, nick, roles FROM prisoners WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id),
+        ).fetchone()
+        if row is None:
+            return None
+        number, nick, roles = row
+        return number, nick, json.loads(roles)
+
+    def admit(self, guild_id: int, user_id: int, nick: str | None, roles: list[int]) -> int | None:
+        """Выдаёт номер и записывает прежнее состояние. None - номера кончились"""
+        bits = self._bitmap(guild_id)
+        start = random.randrange(len(bits))
+        for i in itertools.chain(range(start, len(bits)), range(start)):
+            byte = bits[i]
+            if byte != 0xFF:
+                # младший нулевой бит
+                bit = (~byte & (byte + 1)).bit_length() - 1
+                bits[i] = byte | (1 << bit)
+                number = i * 8 + bit
+                break
+        else:
+            return None
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO prisoners (guild_id, user_id, inmate_number, nick, roles, imprisoned_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (guild_id, user_id, number, nick, json.dumps(roles), time.time()),
+            )
+        return number
+
+    def release(self, guild_id: int, user_id: int):
+        row = self.get(guild_id, user_id)
+        if row is None:
+            return
+        number = row[0]
+        with self.conn:
+            self.conn.execute("DELETE FROM prisoners WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+        bits = self._bitmap(guild_id)
+        bits[number >> 3] &= ~(1 << (number & 7))
+
 
 # ==========================================================
 
-user_cooldowns: dict[int, float] = {}
-active_effect: str | None = None
-effect_end_time: float = 0
-webhook_cache: dict[int, discord.Webhook] = {}
+# всё изменяемое состояние разложено по серверам
+user_cooldowns: dict[int, CooldownStore] = {g.id: CooldownStore(db, g.id, g.cooldown) for g in GUILDS.values()}
+prisoners = PrisonRegistry(db)
+webhook_cache: dict[int, dict[int, list[discord.Webhook]]] = {}   # сервер -> канал -> свободные вебхуки
+webhook_locks: dict[int, asyncio.Lock] = {}                       # канал -> лок выдачи вебхуков
+background_tasks: set[asyncio.Task] = set()                       # цикл держит задачи только по слабой ссылке
+
+
+def spawn(coro) -> asyncio.Task:
+    """Фоновая задача из синхронного колбэка: ссылка живёт до её конца, ошибка попадает в лог"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(forget_task)
+    return task
+
+def forget_task(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task %s failed", task.get_name(), exc_info=task.exception())
 
 intents = discord.Intents.default()
 intents.members = True
 intents.guilds = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix=PREFIX, intents=intents, help_command=None)
+# ==================== лимиты вебхуков ====================
 
+WEBHOOK_ROUTE = re.compile(r"/webhooks/(\d+)/")
+ROUTE_ID = re.compile(r"/\d+")
+WEBHOOK_TOKEN = re.compile(r"(/webhooks/\{id\})/[^/]+")
+API_PREFIX = re.compile(r"^/api/v\d+")
 
-# ==================== утилиты ====================
 
-def is_cyrillic(char: str) -> bool:
-    """Проверяет, является ли символ кириллицей"""
-    return bool(re.match(r'[а-яА-ЯёЁіІїЇєЄґҐ]', char))
+def route_label(method: str, path: str) -> str:
+    """Шаблон маршрута для метрик: без id и токенов, чтобы не плодить серии"""
+    path = WEBHOOK_TOKEN.sub(r"\1/{token}", ROUTE_ID.sub("/{id}", API_PREFIX.sub("", path)))
+    return f"{method} {path}"
 
-def is_letter(char: str) -> bool:
-    """Проверяет, является ли символ буквой (латиница или кириллица)"""
-    return char.isalpha()
 
+class RateBucket:
+    """Остаток лимита одного вебхука по заголовкам ответов Discord"""
+    __slots__ = ("remaining", "reset_at")
 
-# ==================== утилиты эффектов ====================
+    def __init__(self):
+        self.remaining: int | None = None
+        self.reset_at: float = 0.0
 
-def reverse_text(text: str) -> str:
-    """Текст задом наперёд"""
-    return text[::-1]
+    def delay(self) -> float:
+        """Сколько подождать перед следующей отправкой, чтобы не словить 429"""
+        if self.remaining is None or self.remaining > 0:
+            return 0.0
+        return max(0.0, self.reset_at - time.monotonic())
 
-def shuffle_words(text: str) -> str:
-    """Перемешивает слова"""
-    words = text.split()
-    random.shuffle(words)
-    return " ".join(words)
 
-def stutter_text(text: str) -> str:
-    """З-заикание для русского и английского"""
-    words = text.split()
-    result = []
-    for word in words:
-        if len(word) > 1 and is_letter(word[0]):
-            result.append(f"{word[0]}-{word}")
-        else:
-            result.append(word)
-    return " ".join(result)
-
-def censor_text(text: str) -> str:
-    """Цензура случайных слов"""
-    words = text.split()
-    result = []
-    for word in words:
-        if random.random() < 0.35 and len(word) > 2:
-            result.append("█" * len(word))
-        else:
-            result.append(word)
-    return " ".join(result)
-
-def mock_text(text: str) -> str:
-    """СаРкАзМ тЕкСт - работает с любым алфавитом"""
-    result = []
-    upper = False
-    for char in text:
-        if is_letter(char):
-            result.append(char.upper() if upper else char.lower())
-            upper = not upper
-        else:
-            result.append(char)
-    return "".join(result)
-
-def uwu_text(text: str) -> str:
-    """UwU фикация для русского и английского"""
-    # Английские замены
-    text = text.replace("r", "w").replace("R", "W")
-    text = text.replace("l", "w").replace("L", "W")
-    text = text.replace("th", "d").replace("Th", "D").replace("TH", "D")
-    
-    # Русские замены
-    text = text.replace("р", "в").replace("Р", "В")
-    text = text.replace("л", "в").replace("Л", "В")
-    text = text.replace("ш", "с").replace("Ш", "С")
-    text = text.replace("щ", "с").replace("Щ", "С")
-    text = text.replace("ж", "з").replace("Ж", "З")
-    
-    uwu_faces = ["UwU", "OwO", ">w<", "^w^", "~w~", ":3", "x3", "нян~", "ня~"]
-    if random.random() < 0.3:
-        text = f"{random.choice(uwu_faces)} {text}"
-    if random.random() < 0.3:
-        text = f"{text} {random.choice(uwu_faces)}"
-    
-    return text
-
-def leetspeak_text(text: str) -> str:
-    """1337 5p34k для русского и английского"""
-    leet_map = {
-        # Английские
-        'a': '4', 'A': '4', 'e': '3', 'E': '3', 'i': '1', 'I': '1',
-        'o': '0', 'O': '0', 's': '5', 'S': '5', 't': '7', 'T': '7',
-        'b': '8', 'B': '8', 'g': '9', 'G': '9',
-        # Русские
-        'а': '4', 'А': '4', 'е': '3', 'Е': '3', 'ё': '3', 'Ё': '3',
-        'о': '0', 'О': '0', 'з': '3', 'З': '3', 'ч': '4', 'Ч': '4',
-        'б': '6', 'Б': '6', 'в': '8', 'В': '8', 'т': '7', 'Т': '7',
-        'и': '1', 'И': '1', 'й': '1', 'Й': '1', 'л': '7', 'Л': '7',
-    }
-    return "".join(leet_map.get(c, c) for c in text)
-
-def drunk_text(text: str) -> str:
-    """Пьяный текст"""
-    result = []
-    for char in text:
-        result.append(char)
-        if is_letter(char) and random.random() < 0.15:
-            result.append(char * random.randint(1, 3))
-        if random.random() < 0.05:
-            result.append(random.choice(['...', ' *ик*', ' *хик*', ' ', '', ' ыыы']))
-    
-    drunk_endings = [" *ик*", " *хик*", "...", " ззз", " *бурп*", " хехе", ""]
-    return "".join(result) + random.choice(drunk_endings)
-
-def spoiler_text(text: str) -> str:
-    """||Каждое|| ||слово|| ||спойлер||"""
-    words = text.split()
-    return " ".join(f"||{word}||" for word in words)
-
-def clap_text(text: str) -> str:
-    """Каждое 👏 слово 👏 с 👏 хлопком"""
-    words = text.split()
-    return " 👏 ".join(words) + " 👏"
-
-def echo_text(text: str) -> str:
-    """Эхо эхо хо о..."""
-    words = text.split()
-    if len(words) < 1:
-        return text
-    
-    last_word = words[-1]
-    if len(last_word) < 3:
-        return text + "... " + last_word + "..."
-    
-    echo_parts = []
-    for i in range(min(3, len(last_word) - 1)):
-        start = max(1, len(last_word) - 2 - i)
-        part = last_word[start:].lower()
-        if part:
-            echo_parts.append(part)
-    
-    if echo_parts:
-        return text + "... " + "... ".join(echo_parts) + "..."
-    return text + "..."
-
-def dramatic_text(text: str) -> str:
-    """Драматичные... паузы... везде..."""
-    words = text.split()
-    result = []
-    for i, word in enumerate(words):
-        result.append(word)
-        if random.random() < 0.4 or i == len(words) - 1:
-            result.append("...")
-    return " ".join(result)
-
-def glitch_text(text: str) -> str:
-    """З̷а̸л̵г̶о̷ текст"""
-    zalgo_chars = [
-        '\u0300', '\u0301', '\u0302', '\u0303', '\u0304', '\u0305', '\u0306', '\u0307',
-        '\u0308', '\u0309', '\u030A', '\u030B', '\u030C', '\u030D', '\u030E', '\u030F',
-        '\u0310', '\u0311', '\u0312', '\u0313', '\u0314', '\u0315', '\u031A', '\u031B',
-        '\u033D', '\u033E', '\u033F', '\u0340', '\u0341', '\u0342', '\u0343', '\u0344',
-        '\u0346', '\u034A', '\u034B', '\u034C', '\u0350', '\u0351', '\u0352', '\u0357',
-    ]
-    result = []
-    for char in text:
-        result.append(char)
-        if is_letter(char):
-            for _ in range(random.randint(1, 3)):
-                result.append(random.choice(zalgo_chars))
-    return "".join(result)
-
-def snake_text(text: str) -> str:
-    """Шшшипение сссловами - русский и английский"""
-    result = []
-    for word in text.split():
-        if not word:
-            continue
-        first = word[0].lower()
-        # Английские шипящие
-        if first == 's':
-            word = 'sss' + word[1:]
-        elif first in 'cz':
-            word = word[0] + 'ss' + word[1:]
-        # Русские шипящие
-        elif first == 'с':
-            word = 'ссс' + word[1:]
-        elif first == 'ш':
-            word = 'шшш' + word[1:]
-        elif first == 'щ':
-            word = 'щщщ' + word[1:]
-        elif first == 'ж':
-            word = 'жжж' + word[1:]
-        elif first == 'з':
-            word = 'ззз' + word[1:]
-        elif first == 'ч':
-            word = 'ччч' + word[1:]
-        
-        if random.random() < 0.2:
-            # Добавляем шипение в конец
-            if any(c in word.lower() for c in 'сшщзж'):
-                word = word + "ссс"
-            elif any(c in word.lower() for c in 'szc'):
-                word = word + "sss"
-        result.append(word)
-    return " ".join(result)
-
-def backwards_words_text(text: str) -> str:
-    """Каждое слово задом наперёд"""
-    words = text.split()
-    return " ".join(word[::-1] for word in words)
-
-def tiny_text(text: str) -> str:
-    """Маленькие буквы (надстрочные)"""
-    tiny_map = {
-        # Латиница
-        'a': 'ᵃ', 'b': 'ᵇ', 'c': 'ᶜ', 'd': 'ᵈ', 'e': 'ᵉ', 'f': 'ᶠ', 'g': 'ᵍ',
-        'h': 'ʰ', 'i': 'ⁱ', 'j': 'ʲ', 'k': 'ᵏ', 'l': 'ˡ', 'm': 'ᵐ', 'n': 'ⁿ',
-        'o': 'ᵒ', 'p': 'ᵖ', 'q': 'q', 'r': 'ʳ', 's': 'ˢ', 't': 'ᵗ', 'u': 'ᵘ',
-        'v': 'ᵛ', 'w': 'ʷ', 'x': 'ˣ', 'y': 'ʸ', 'z': 'ᶻ',
-        'A': 'ᴬ', 'B': 'ᴮ', 'C': 'ᶜ', 'D': 'ᴰ', 'E': 'ᴱ', 'F': 'ᶠ', 'G': 'ᴳ',
-        'H': 'ᴴ', 'I': 'ᴵ', 'J': 'ᴶ', 'K': 'ᴷ', 'L': 'ᴸ', 'M': 'ᴹ', 'N': 'ᴺ',
-        'O': 'ᴼ', 'P': 'ᴾ', 'Q': 'Q', 'R': 'ᴿ', 'S': 'ˢ', 'T': 'ᵀ', 'U': 'ᵁ',
-        'V': 'ⱽ', 'W': 'ᵂ', 'X': 'ˣ', 'Y': 'ʸ', 'Z': 'ᶻ',
-        # Кириллица (используем похожие символы где возможно)
-        'а': 'ᵃ', 'б': 'ᵇ', 'в': 'ᵛ', 'г': 'ᵍ', 'д': 'ᵈ', 'е': 'ᵉ', 'ё': 'ᵉ',
-        'ж': 'ж', 'з': 'ᶻ', 'и': 'ⁱ', 'й': 'ⁱ', 'к': 'ᵏ', 'л': 'ˡ', 'м': 'ᵐ',
-        'н': 'ⁿ', 'о': 'ᵒ', 'п': 'ᵖ', 'р': 'ʳ', 'с': 'ᶜ', 'т': 'ᵗ', 'у': 'ʸ',
-        'ф': 'ᶠ', 'х': 'ˣ', 'ц': 'ᶜ', 'ч': 'ᶜ', 'ш': 'ш', 'щ': 'щ', 'ъ': 'ъ',
-        'ы': 'ʸ', 'ь': 'ь', 'э': 'ᵉ', 'ю': 'ю', 'я': 'ʸ',
-        'А': 'ᴬ', 'Б': 'ᴮ', 'В': 'ⱽ', 'Г': 'ᴳ', 'Д': 'ᴰ', 'Е': 'ᴱ', 'Ё': 'ᴱ',
-        'Ж': 'Ж', 'З': 'ᶻ', 'И': 'ᴵ', 'Й': 'ᴵ', 'К': 'ᴷ', 'Л': 'ᴸ', 'М': 'ᴹ',
-        'Н': 'ᴺ', 'О': 'ᴼ', 'П': 'ᴾ', 'Р': 'ᴿ', 'С': 'ᶜ', 'Т': 'ᵀ', 'У': 'ʸ',
-        'Ф': 'ᶠ', 'Х': 'ˣ', 'Ц': 'ᶜ', 'Ч': 'ᶜ', 'Ш': 'Ш', 'Щ': 'Щ', 'Ъ': 'Ъ',
-        'Ы': 'ʸ', 'Ь': 'Ь', 'Э': 'ᴱ', 'Ю': 'Ю', 'Я': 'ʸ',
-    }
-    return "".join(tiny_map.get(c, c) for c in text)
-
-def yell_text(text: str) -> str:
-    """КРИК!!! С ВОСКЛИЦАНИЯМИ!!!"""
-    text = text.upper()
-    words = text.split()
-    result = []
-    for word in words:
-        exclamations = "!" * random.randint(1, 3)
-        result.append(word + exclamations)
-    return " ".join(result)
-
-def confused_text(text: str) -> str:
-    """Путаница в буквах"""
-    result = []
-    for word in text.split():
-        new_word = list(word)
-        # Дублируем случайные буквы
-        for i in range(len(new_word)):
-            if is_letter(new_word[i]) and random.random() < 0.2:
-                new_word[i] = new_word[i] * 2
-        # Меняем местами случайные буквы
-        if len(new_word) > 3 and random.random() < 0.3:
-            indices = [j for j in range(len(new_word)) if is_letter(new_word[j])]
-            if len(indices) >= 2:
-                i, j = random.sample(indices, 2)
-                new_word[i], new_word[j] = new_word[j], new_word[i]
-        result.append("".join(new_word))
-    
-    return " ".join(result) + "???"
-
-def pirate_text(text: str) -> str:
-    """Пиратский говор - русский и английский"""
-    # Определяем язык по первым буквам
-    has_cyrillic = any(is_cyrillic(c) for c in text)
-    
-    if has_cyrillic:
-        # Русский пиратский
-        replacements = {
-            "привет": "йо-хо-хо", "здравствуй": "йо-хо-хо", "здравствуйте": "йо-хо-хо",
-            "да": "так точно, капитан", "нет": "никак нет", "хорошо": "добре",
-            "друг": "морской волк", "друзья": "морские волки", "деньги": "дублоны",
-            "человек": "морской пёс", "люди": "морские псы", "ты": "ты, каналья",
-            "я": "йа, пират", "мы": "мы, пираты", "мой": "мой пиратский",
-            "пойдём": "отдать швартовы", "идём": "полный вперёд",
-        }
-        pirate_starts = ["Йо-хо-хо!", "Тысяча чертей!", "Разрази меня гром!", "Карамба!", "Пиастры!"]
-        pirate_ends = [", тысяча чертей!", ", морской волк!", ", каналья!", ", йо-хо-хо!", ""]
-    else:
-        # Английский пиратский
-        replacements = {
-            "my": "me", "you": "ye", "your": "yer", "is": "be", "are": "be",
-            "hello": "ahoy", "hi": "ahoy", "friend": "matey", "friends": "mateys",
-            "man": "landlubber", "money": "doubloons", "treasure": "booty",
-            "yes": "aye", "no": "nay", "the": "th'",
-        }
-        pirate_starts = ["Arr!", "Yarr!", "Ahoy!", "Avast!", "Shiver me timbers!"]
-        pirate_ends = [", matey!", ", arr!", ", ye scallywag!", ""]
-    
-    words = text.lower().split()
-    result = [replacements.get(w, w) for w in words]
-    
-    return f"{random.choice(pirate_starts)} {' '.join(result)}{random.choice(pirate_ends)}"
-
-def robot_text(text: str) -> str:
-    """BEEP. BOOP. ROBOT. SPEAK."""
-    # Определяем язык
-    has_cyrillic = any(is_cyrillic(c) for c in text)
-    
-    words = text.upper().split()
-    result = ". ".join(words) + "."
-    
-    if has_cyrillic:
-        robot_prefixes = ["БИП БУП.", "[ОБРАБОТКА]", "[ПЕРЕДАЧА]", "01100010:", "[РОБОТ]"]
-    else:
-        robot_prefixes = ["BEEP BOOP.", "[PROCESSING]", "[TRANSMISSION]", "01100010:", "[ROBOT]"]
-    
-    return f"{random.choice(robot_prefixes)} {result}"
-
-def medieval_text(text: str) -> str:
-    """Старинный стиль - русский и английский"""
-    has_cyrillic = any(is_cyrillic(c) for c in text)
-    
-    if has_cyrillic:
-        # Старославянский стиль
-        replacements = {
-            "ты": "ты, сударь", "вы": "вы, милостивый государь",
-            "я": "аз", "мы": "мы, грешные",
-            "есть": "есьм", "быть": "быти",
-            "говорить": "молвити", "сказать": "рекоша",
-            "хорошо": "зело добре", "плохо": "худо",
-            "да": "истинно", "нет": "несть",
-            "привет": "здравия желаю", "пока": "прощевай",
-            "друг": "друже", "человек": "человече",
-            "что": "чаво", "как": "како",
-        }
-        medieval_starts = ["Внемлите!", "Слушайте же!", "Азъ реку:", "Истинно глаголю:", "Вот те крест!"]
-        medieval_ends = [", сударь.", ", батюшка.", ", истинно.", ""]
+webhook_buckets: dict[int, RateBucket] = {}
+
+
+async def on_http_request_end(session, ctx, params: aiohttp.TraceRequestEndParams):
+    """Считает 429 по всем маршрутам и снимает X-RateLimit-* с ответов вебхукам"""
+    limited = params.response.status == 429
+    if limited:
+        metrics.inc("rate_limit_hits", route=route_label(params.method, params.url.path))
+    match = WEBHOOK_ROUTE.search(params.url.path)
+    if match is None:
+        return
+    headers = params.response.headers
+    bucket = webhook_buckets.setdefault(int(match.group(1)), RateBucket())
+
+    if limited:
+        bucket.remaining = 0
+        reset_after = headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After")
     else:
-        replacements = {
-            "you": "thee", "your": "thy", "yours": "thine",
-            "are": "art", "is": "be", "have": "hast", "has": "hath",
-            "will": "shall", "do": "doth", "hello": "hail",
-            "hi": "greetings", "good": "most wondrous",
-        }
-        medieval_starts = ["Hark!", "Hear ye!", "Prithee,", "Forsooth,", "Verily,"]
-        medieval_ends = [", m'lord.", ", good sir.", ", I say!", ""]
-    
-    words = text.lower().split()
-    result = [replacements.get(w, w) for w in words]
-    
-    return f"{random.choice(medieval_starts)} {' '.join(result)}{random.choice(medieval_ends)}"
-
-def sarcasm_quotes_text(text: str) -> str:
-    """"Конечно" ты "очень" "умный\""""
-    words = text.split()
-    result = []
-    for word in words:
-        if len(word) > 2 and random.random() < 0.35:
-            result.append(f'"{word}"')
-        else:
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None:
+            bucket.remaining = int(remaining)
+        reset_after = headers.get("X-RateLimit-Reset-After")
+
+    if reset_after is not None:
+        bucket.reset_at = time.monotonic() + float(reset_after)
+
+
+http_trace = aiohttp.TraceConfig()
+http_trace.on_request_end.append(on_http_request_end)
+
+class ToxicityBot(commands.AutoShardedBot):
+    """Бот, который перед выключением дописывает отложенные репосты"""
+
+    async def setup_hook(self):
+        # Procfile-деплой гасит процесс SIGTERM'ом - закрываемся штатно
+        try:
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGTERM, lambda: spawn(self.close()))
+            # SIGHUP - перечитать config.yml без переподключения к гейтвею
+            loop.add_signal_handler(signal.SIGHUP, reload_config)
+        except (NotImplementedError, AttributeError):
+            pass
+
+        try:
+            self.metrics_runner = await serve_metrics()
+        except OSError as e:
+            self.metrics_runner = None
+            logger.error("Failed to serve metrics: %s", e)
+        metrics_summary.start()
+        self.lag_watch = asyncio.create_task(watch_loop_lag())
+
+    async def close(self):
+        if not self.is_closed():
+            await delayed_sends.drain()
+            metrics_summary.cancel()
+            if getattr(self, "lag_watch", None) is not None:
+                self.lag_watch.cancel()
+            transform_executor.shutdown()
+            if getattr(self, "metrics_runner", None) is not None:
+                await self.metrics_runner.cleanup()
+        await super().close()
+
+
+bot = ToxicityBot(
+    command_prefix=PREFIX, intents=intents, help_command=None, http_trace=http_trace, **shard_options()
+)
+
+
+# ==================== реестр эффектов ====================
+
+# модули эффектов импортируются при первом выборе, параметры - из wizard.effects
+EFFECTS = EffectRegistry()
+EFFECTS.discover()
+EFFECTS.configure(WIZARD["effects"])
+
+
+# ==================== хаос ====================
+
+def fuse_effects(names: list[str]) -> Effect:
+    """Склеивает стопку пословных эффектов в один проход по словам.
+
+    Результат такой же, как если применить эффекты по очереди, но без
+    промежуточных строк, с одним удалением и одной отправкой. Слитный
+    проход склеивает слова через один пробел, поэтому в стопке нужен хотя бы
+    один эффект, который делает так же сам: иначе переводы строк и двойные
+    пробелы исчезли бы только в хаосе.
+    """
+    if len(names) < 2:
+        raise ValueError("a chaos stack needs at least two effects")
+    if len(set(names)) != len(names):
+        raise ValueError("effects in a chaos stack must not repeat")
+    stages = []
+    for name in names:
+        effect = EFFECTS.get(name)
+        if effect is None:
+            raise ValueError(f"unknown effect {name!r}")
+        if effect.stage is None:
+            raise ValueError(f"effect {name!r} cannot be stacked")
+        stages.append(effect.stage)
+    if any(stage.joiner for stage in stages[:-1]):
+        raise ValueError("an effect that joins words must be last in the stack")
+    if not any(stage.splits for stage in stages):
+        raise ValueError("a chaos stack needs an effect that splits text into words")
+
+    joiner = stages[-1].joiner or " "
+    suffix = "".join(stage.suffix for stage in stages)
+
+    def transform(text: str, profile: TextProfile | None = None) -> str:
+        profile = profile or TextProfile(text)
+        word_fns = [stage.start(profile) for stage in stages]
+        result = []
+        for word in profile.words:
+            for fn in word_fns:
+                word = fn(word)
             result.append(word)
-    return " ".join(result)
-
-def void_text(text: str) -> str:
-    """р а з р я д к а"""
-    spaced = " ".join(text)
-    void_symbols = [".", "·", "•", "。", "॰", "᛫"]
-    symbol = random.choice(void_symbols)
-    return f"{symbol}  {spaced}  {symbol}"
-
-def hacker_text(text: str) -> str:
-    """[SYSTEM]: Message intercepted..."""
-    has_cyrillic = any(is_cyrillic(c) for c in text)
-    
-    if has_cyrillic:
-        hacker_prefixes = [
-            "[ПЕРЕХВАЧЕНО]:", "[РАСШИФРОВАНО]:", "[ВЗЛОМ СИСТЕМЫ]:",
-            "[УТЕЧКА ДАННЫХ]:", "[СЛЕЖКА]:", ">>> ВЫВОД:",
-        ]
-    else:
-        hacker_prefixes = [
-            "[INTERCEPTED]:", "[DECRYPTED]:", "[SYSTEM BREACH]:",
-            "[DATA LEAK]:", "[TRACE DETECTED]:", ">>> STDOUT:",
-        ]
-    
-    glitched = leetspeak_text(text)
-    return f"```\n{random.choice(hacker_prefixes)} {glitched}\n```"
-
-def musical_text(text: str) -> str:
-    """🎵 Каждое слово как песня 🎶"""
-    notes = ["🎵", "🎶", "🎼", "🎤", "🎸", "🎹", "🎺", "🎻", "🥁", "🪘", "🎧", "🎷"]
-    words = text.split()
-    result = []
-    for word in words:
-        result.append(f"{random.choice(notes)} {word}")
-    return " ".join(result) + f" {random.choice(notes)}"
-
-def explosion_text(text: str) -> str:
-    """💥 BOOM 💥 эффекты везде"""
-    explosions = ["💥", "🔥", "✨", "⚡", "🌟", "💫", "☄️", "🎆", "🎇", "💣", "🧨"]
-    text = text.upper()
-    words = text.split()
-    result = []
-    for word in words:
-        result.append(f"{random.choice(explosions)} {word}")
-    return " ".join(result) + f" {random.choice(explosions)}"
-
-def baby_text(text: str) -> str:
-    """Детский лепет - агу агу"""
-    has_cyrillic = any(is_cyrillic(c) for c in text)
-    
-    if has_cyrillic:
-        # Русский детский
-        text = text.replace("р", "л").replace("Р", "Л")
-        text = text.replace("ш", "с").replace("Ш", "С")
-        text = text.replace("ж", "з").replace("Ж", "З")
-        text = text.replace("щ", "с").replace("Щ", "С")
-        baby_words = ["агу", "ня", "мама", "дай", "хочу", "ааа"]
-    else:
-        text = text.replace("r", "w").replace("R", "W")
-        text = text.replace("l", "w").replace("L", "W")
-        baby_words = ["goo goo", "ga ga", "mama", "dada", "waah"]
-    
-    if random.random() < 0.3:
-        text = f"{random.choice(baby_words)}! {text}"
-    if random.random() < 0.3:
-        text = f"{text} {random.choice(baby_words)}!"
-    
-    return text
-
-def owoify_text(text: str) -> str:
-    """OwO что это? - более агрессивный uwu"""
-    has_cyrillic = any(is_cyrillic(c) for c in text)
-    
-    if has_cyrillic:
-        text = text.replace("р", "в").replace("Р", "В")
-        text = text.replace("л", "в").replace("Л", "В")
-        text = text.replace("ш", "ф").replace("Ш", "Ф")
-        text = text.replace("щ", "ф").replace("Щ", "Ф")
-        text = text.replace("ж", "ш").replace("Ж", "Ш")
-        text = text.replace("на", "ня").replace("На", "Ня")
-        text = text.replace("ни", "ни~").replace("Ни", "Ни~")
-        faces = ["OwO", "UwU", ">w<", "^w^", "ня~", "нян!", ":3", "(✿◠‿◠)"]
-    else:
-        text = text.replace("r", "w").replace("R", "W")
-        text = text.replace("l", "w").replace("L", "W")
-        text = text.replace("na", "nya").replace("Na", "Nya")
-        text = text.replace("ni", "nyi").replace("Ni", "Nyi")
-        text = text.replace("no", "nyo").replace("No", "Nyo")
-        faces = ["OwO", "UwU", ">w<", "^w^", "~w~", ":3", "(✿◠‿◠)", "nyaa~"]
-    
-    # Добавляем случайные лица
-    words = text.split()
-    result = []
-    for word in words:
-        result.append(word)
-        if random.random() < 0.15:
-            result.append(random.choice(faces))
-    
-    return " ".join(result)
-
-def angry_text(text: str) -> str:
-    """ЗЛОЙ ТЕКСТ 😡"""
-    text = text.upper()
-    has_cyrillic = any(is_cyrillic(c) for c in text)
-    
-    if has_cyrillic:
-        angry_inserts = ["БЛИН", "ААААА", "ДА КАК ТАК", "ЧЁРТ", "ОЙ ВСЁ"]
-    else:
-        angry_inserts = ["UGH", "ARGH", "GRRRR", "DAMN", "SERIOUSLY"]
-    
-    words = text.split()
-    result = []
-    for word in words:
-        result.append(word)
-        if random.random() < 0.2:
-            result.append(random.choice(angry_inserts))
-    
-    angry_emojis = ["😡", "🤬", "💢", "👿", "😤"]
-    return " ".join(result) + " " + random.choice(angry_emojis) * random.randint(1, 3)
-
-def creepy_text(text: str) -> str:
-    """Жуткий текст..."""
-    has_cyrillic = any(is_cyrillic(c) for c in text)
-    
-    words = text.lower().split()
-    result = []
-    for word in words:
-        # Растягиваем случайные буквы
-        new_word = list(word)
-        for i in range(len(new_word)):
-            if is_letter(new_word[i]) and random.random() < 0.2:
-                new_word[i] = new_word[i] * random.randint(2, 4)
-        result.append("".join(new_word))
-    
-    text = " ".join(result)
-    
-    if has_cyrillic:
-        creepy_adds = ["...", " хе-хе-хе...", " я вижу тебя...", " беги...", ""]
-    else:
-        creepy_adds = ["...", " hehe...", " I see you...", " run...", ""]
-    
-    creepy_emojis = ["👁️", "🌚", "👀", "🫥", "💀", "🕷️"]
-    
-    return f"{random.choice(creepy_emojis)} {text}{random.choice(creepy_adds)} {random.choice(creepy_emojis)}"
+        return joiner.join(result) + suffix
+
+    # граница стопки - композиция границ по порядку
+    factor, extra = 1.0, 0
+    for name in names:
+        f, e = EFFECTS[name].expansion
+        factor, extra = factor * f, math.ceil(f * extra) + e
+
+    deterministic = all(EFFECTS[name].deterministic for name in names)
+    cost = sum(EFFECTS[name].cost for name in names)
+    return Effect("+".join(names), transform, expansion=(factor, extra), deterministic=deterministic, cost=cost)
+
+def compile_chaos(stacks: tuple[tuple[str, ...], ...]) -> tuple[str, ...]:
+    """Регистрирует стопки хаоса сервера в реестре, одинаковые стопки общие"""
+    names = []
+    for stack in stacks:
+        name = "+".join(stack)
+        if name not in EFFECTS:
+            try:
+                EFFECTS.register(fuse_effects(list(stack)))
+            except ValueError as e:
+                raise ConfigError(f"chaos stack {list(stack)}: {e}") from None
+        names.append(name)
+    return tuple(names)
+
+try:
+    CHAOS_EFFECTS: dict[int, tuple[str, ...]] = {g.id: compile_chaos(g.chaos_stacks) for g in GUILDS.values()}
+except ConfigError as e:
+    logger.critical("Invalid chaos config: %s", e)
+    exit(1)
+
+
+# ==================== исполнение трансформаций ====================
+
+CACHE_HIT: Labels = (("result", "hit"),)
+CACHE_MISS: Labels = (("result", "miss"),)
+
+class TransformCache:
+    """LRU результатов детерминированных эффектов: (эффект, текст) -> текст.
+
+    Флуд в канале колдуна однообразный ("лол", копипаста), поэтому повтор
+    стоит одного поиска в словаре. Случайные эффекты идут мимо кэша.
+    Трогается только из цикла событий, пул трансформаций его не видит.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries: collections.OrderedDict[tuple[str, str], str] = collections.OrderedDict()
+
+    def get(self, spec: Effect, text: str) -> str | None:
+        if not spec.deterministic or self.size <= 0:
+            return None
+        key = (spec.name, text)
+        result = self.entries.get(key)
+        if result is None:
+            metrics.inc_labels("transform_cache", CACHE_MISS)
+            return None
+        self.entries.move_to_end(key)
+        metrics.inc_labels("transform_cache", CACHE_HIT)
+        return result
+
+    def put(self, spec: Effect, text: str, result: str):
+        if not spec.deterministic or self.size <= 0:
+            return
+        self.entries[(spec.name, text)] = result
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def resize(self, size: int):
+        self.size = size
+        while len(self.entries) > max(size, 0):
+            self.entries.popitem(last=False)
+
+def run_transform(spec: Effect, text: str) -> str:
+    return spec.transform(text, TextProfile(text))
+
+class TransformExecutor:
+    """Где считать трансформацию: дешёвое - прямо в цикле, дорогое - в пуле.
+
+    Оценка - Effect.cost мкс на символ, умноженная на длину текста. Всё, что
+    дороже TRANSFORMS["inline_us"], уходит в пул потоков с бюджетом
+    TRANSFORMS["timeout_seconds"]; не уложились - репостим исходный текст.
+    Пул потоков, а не процессов: лямбды и замыкания хаоса не пиклятся, а
+    поток с трансформацией отдаёт GIL циклу каждые несколько миллисекунд.
+    Поток, вылетевший за бюджет, досчитает вхолостую - прервать его нельзя.
+    """
+
+    def __init__(self, workers: int):
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transform")
+
+    async def transform(self, spec: Effect, text: str) -> str:
+        result = transform_cache.get(spec, text)
+        if result is not None:
+            return result
+
+        if spec.cost * len(text) <= TRANSFORMS["inline_us"]:
+            with metrics.timer("transform", effect=spec.name):
+                result = run_transform(spec, text)
+        else:
+            loop = asyncio.get_running_loop()
+            metrics.inc("transform_offloaded", effect=spec.name)
+            try:
+                with metrics.timer("transform_offload", effect=spec.name):
+                    result = await asyncio.wait_for(
+                        loop.run_in_executor(self.pool, run_transform, spec, text), TRANSFORMS["timeout_seconds"]
+                    )
+            except asyncio.TimeoutError:
+                logger.warning("Transform %s ran over budget on %s chars, sending the original", spec.name, len(text))
+                metrics.inc("transform_timeouts", effect=spec.name)
+                return text
+
+        transform_cache.put(spec, text, result)
+        return result
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+transform_cache = TransformCache(TRANSFORM_CACHE["size"])
+transform_executor = TransformExecutor(TRANSFORMS["workers"])
+metrics.gauge("transform_cache_entries", lambda: len(transform_cache.entries))
+
+LOOP_LAG_INTERVAL = 0.25
+
+async def watch_loop_lag():
+    """На сколько позже положенного просыпается цикл событий - метрика loop_lag"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        metrics.observe_labels("loop_lag", loop.time() - start - LOOP_LAG_INTERVAL, ())
 
 
 # ==================== вебхук ====================
 
+@metrics.timed("webhook_create")
 async def get_or_create_webhook(channel: discord.TextChannel) -> discord.Webhook:
+    """Выдаёт свободный вебхук для пула канала.
+
+    Сначала разбираются уже существующие вебхуки канала с нашим именем,
+    когда они кончаются - создаётся новый. Воркеры пула приходят сюда
+    одновременно, поэтому выдача идёт под локом канала: иначе второй
+    список вебхуков вернёт уже выданный первому воркеру и пул схлопнется.
+    """
     try:
-        if channel.id in webhook_cache:
-            return webhook_cache[channel.id]
-        webhooks = await channel.webhooks()
-        for wh in webhooks:
-            if wh.name == "WizardEffect":
-                webhook_cache[channel.id] = wh
-                return wh
-        wh = await channel.create_webhook(name="WizardEffect")
-        webhook_cache[channel.id] = wh
-        return wh
+        async with webhook_locks.setdefault(channel.id, asyncio.Lock()):
+            cache = webhook_cache.setdefault(channel.guild.id, {})
+            spare = cache.get(channel.id)
+            if spare is None:
+                webhooks = await channel.webhooks()
+                spare = cache[channel.id] = [wh for wh in webhooks if wh.name == WEBHOOKS["name"]]
+            if spare:
+                return spare.pop()
+            return await channel.create_webhook(name=WEBHOOKS["name"])
     except Exception as e:
-        logger.error(f"Webhook error: {e}")
+        logger.error("Webhook error: %s", e)
         raise
 
 
-# ==================== применение эффекта ====================
+# ==================== очередь отправки ====================
 
-async def apply_effect(message: discord.Message, effect: str, original: str) -> bool:
-    """Применяет эффект к сообщению. Возвращает True если обработано."""
-    try:
-        # Эффекты без вебхука
-        if effect == "anonymous":
-            await message.delete()
-            embed = discord.Embed(description=original, color=random.choice(COLORS))
-            embed.set_author(name=WIZARD["messages"]["anonymous_format"])
-            await message.channel.send(embed=embed)
-            return True
+class WebhookOutbox:
+    """Очередь исходящих вебхук-отправок одного канала.
 
-        # Slowmode обрабатывается Discord'ом
-        if effect in ("slowmode", "mega_slowmode"):
-            return False
+    Очередь разбирает пул воркеров, у каждого свой вебхук. Воркер берёт
+    следующую отправку только когда у его вебхука есть лимит, так что
+    работа сама уходит к наименее загруженному вебхуку и 429 не ловится.
+    Пул растёт лениво: новый воркер появляется, только когда все заняты.
+    """
 
-        # Словарь всех эффектов
-        effect_functions = {
-            "reverse": reverse_text,
-            "caps": lambda t: t.upper(),
-            "whisper": lambda t: f"*{t.lower()}*",
-            "shuffle": shuffle_words,
-            "stutter": stutter_text,
-            "censor": censor_text,
-            "mock": mock_text,
-            "uwu": uwu_text,
-            "leetspeak": leetspeak_text,
-            "drunk": drunk_text,
-            "spoiler": spoiler_text,
-            "clap": clap_text,
-            "echo": echo_text,
-            "dramatic": dramatic_text,
-            "glitch": glitch_text,
-            "zalgo_lite": glitch_text,
-            "snake": snake_text,
-            "backwards_words": backwards_words_text,
-            "tiny": tiny_text,
-            "yell": yell_text,
-            "confused": confused_text,
-            "pirate": pirate_text,
-            "robot": robot_text,
-            "medieval": medieval_text,
-            "sarcasm_quotes": sarcasm_quotes_text,
-            "void": void_text,
-            "hacker": hacker_text,
-            "musical": musical_text,
-            "explosion": explosion_text,
-            "baby": baby_text,
-            "owoify": owoify_text,
-            "angry": angry_text,
-            "creepy": creepy_text,
-        }
+    def __init__(self, channel: discord.TextChannel):
+        self.channel = channel
+        self.queue: asyncio.Queue[tuple[dict, asyncio.Future]] = asyncio.Queue()
+        self.workers: list[asyncio.Task] = []
+        self.idle = 0
 
-        if effect in effect_functions:
-            await message.delete()
-            wh = await get_or_create_webhook(message.channel)
-            new_content = effect_functions[effect](original)
-            await wh.send(
-                content=new_content,
-                username=message.author.display_name,
-                avatar_url=message.author.display_avatar.url,
-            )
-            return True
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
 
-        elif effect == "emoji_tax":
-            await message.delete()
-            emojis = WIZARD["effects"]["emoji_tax"].get("emojis", ["🤡", "💀", "👺"])
-            wh = await get_or_create_webhook(message.channel)
-            await wh.send(
-                content=f"{original} {random.choice(emojis)}",
-                username=message.author.display_name,
-                avatar_url=message.author.display_avatar.url,
-            )
-            return True
+    async def send(self, **kwargs) -> discord.WebhookMessage | None:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((kwargs, future))
+        self._grow()
 
-        elif effect == "delay":
-            await message.delete()
-            delay = WIZARD["effects"]["delay"].get("delay_seconds", 5)
-            await asyncio.sleep(delay)
-            wh = await get_or_create_webhook(message.channel)
-            await wh.send(
-                content=original,
-                username=message.author.display_name,
-                avatar_url=message.author.display_avatar.url,
-            )
-            return True
+        depth = self.depth
+        if depth and depth % WEBHOOKS["queue_warn_depth"] == 0:
+            logger.warning("Webhook queue for channel %s is %s deep", self.channel.id, depth)
+        return await future
 
-        elif effect == "double":
-            await message.delete()
-            wh = await get_or_create_webhook(message.channel)
-            await wh.send(
-                content=original,
-                username=message.author.display_name,
-                avatar_url=message.author.display_avatar.url,
-            )
-            await asyncio.sleep(0.5)
-            await wh.send(
-                content=original,
-                username=message.author.display_name,
-                avatar_url=message.author.display_avatar.url,
-            )
-            return True
+    def _grow(self):
+        self.workers = [w for w in self.workers if not w.done()]
+        if self.idle == 0 and len(self.workers) < WEBHOOKS["pool_size"]:
+            self.workers.append(asyncio.create_task(self._run()))
 
-        return False
+    async def _run(self):
+        wh: discord.Webhook | None = None
+        while True:
+            if wh is not None:
+                delay = webhook_buckets.setdefault(wh.id, RateBucket()).delay()
+                if delay:
+                    await asyncio.sleep(delay)
 
-    except discord.NotFound:
-        logger.warning(f"Message already deleted for effect {effect}")
-        return True
-    except discord.Forbidden as e:
-        logger.error(f"Permission error in effect {effect}: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"Error applying effect {effect}: {e}\n{traceback.format_exc()}")
-        return False
+            self.idle += 1
+            try:
+                kwargs, future = await self.queue.get()
+            finally:
+                self.idle -= 1
+            if future.done():
+                continue
+
+            for attempt in range(2):
+                try:
+                    if wh is None:
+                        wh = await get_or_create_webhook(self.channel)
+                        delay = webhook_buckets.setdefault(wh.id, RateBucket()).delay()
+                        if delay:
+                            await asyncio.sleep(delay)
+                    with metrics.timer("webhook_send"):
+                        result = await wh.send(**kwargs)
+                except discord.NotFound as e:
+                    # вебхук удалили руками - выкидываем из пула и берём другой
+                    if wh is not None:
+                        logger.warning("Webhook %s in channel %s is gone, replacing it", wh.id, self.channel.id)
+                        webhook_buckets.pop(wh.id, None)
+                        wh = None
+                    if attempt and not future.done():
+                        future.set_exception(e)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    break
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                    break
+
+
+outboxes: dict[int, dict[int, WebhookOutbox]] = {}    # сервер -> канал -> очередь
+
+def outbox_for(channel: discord.TextChannel) -> WebhookOutbox:
+    guild_outboxes = outboxes.setdefault(channel.guild.id, {})
+    outbox = guild_outboxes.get(channel.id)
+    if outbox is None:
+        outbox = guild_outboxes[channel.id] = WebhookOutbox(channel)
+    return outbox
+
+def queue_depths() -> dict[int, int]:
+    """Глубина очереди вебхуков по каналам"""
+    return {
+        channel_id: outbox.depth
+        for guild_outboxes in outboxes.values()
+        for channel_id, outbox in guild_outboxes.items()
+    }
 
+metrics.gauge(
+    "webhook_queue_depth",
+    lambda: {(("channel", str(channel_id)),): depth for channel_id, depth in queue_depths().items()},
+)
 
-# ==================== колдун таск =========================
+def drop_guild(guild_id: int):
+    """Забывает очереди и вебхуки сервера, с которого бот ушёл"""
+    for outbox in outboxes.pop(guild_id, {}).values():
+        for worker in outbox.workers:
+            worker.cancel()
+    for channel_id in webhook_cache.pop(guild_id, {}):
+        webhook_locks.pop(channel_id, None)
+    flood.drop(guild_id)
+    for channel_id, dispatch in list(anonymous_dispatch.items()):
+        if dispatch.channel.guild.id == guild_id:
+            del anonymous_dispatch[channel_id]
+
+
+# ==================== длина сообщения ====================
+
+def is_grapheme_extend(char: str) -> bool:
+    """Символ цепляется к предыдущему и не может начинать графему"""
+    code = ord(char)
+    return (
+        unicodedata.category(char) in ("Mn", "Me", "Mc")
+        or code == 0x200D                     # ZWJ
+        or 0xFE00 <= code <= 0xFE0F           # variation selectors
+        or 0x1F3FB <= code <= 0x1F3FF         # цвет кожи
+        or 0xE0020 <= code <= 0xE007F         # теги флагов
+        or 0xE0100 <= code <= 0xE01EF
+    )
+
+def is_regional_indicator(char: str) -> bool:
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+def grapheme_cut(text: str, limit: int) -> int:
+    """Наибольшая позиция <= limit, по которой можно резать, не ломая графему"""
+    if len(text) <= limit:
+        return len(text)
+    cut = limit
+    while cut > 0 and (
+        is_grapheme_extend(text[cut])
+        or text[cut - 1] == "\u200d"
+        or (text[cut - 1] == "\r" and text[cut] == "\n")
+    ):
+        cut -= 1
+    # флаги - пары региональных индикаторов, нечётное число перед разрезом значит середину флага
+    pairs = 0
+    while cut - pairs > 0 and is_regional_indicator(text[cut - pairs - 1]):
+        pairs += 1
+    if pairs % 2 and is_regional_indicator(text[cut]):
+        cut -= 1
+    return cut or limit
+
+def fit_message(text: str) -> list[str]:
+    """Режет ответ под лимит Discord: на части по пробелам или с обрезкой"""
+    limit = WEBHOOKS["max_length"]
+    if len(text) <= limit:
+        return [text]
+    if WEBHOOKS["overflow"] == "truncate":
+        return [text[:grapheme_cut(text, limit - 1)] + "…"]
+
+    parts = []
+    while len(text) > limit:
+        if len(parts) == WEBHOOKS["max_parts"] - 1:
+            parts.append(text[:grapheme_cut(text, limit - 1)] + "…")
+            return parts
+        cut = grapheme_cut(text, limit)
+        # лучше по переносу строки или пробелу, если он не слишком далеко
+        space = max(text.rfind("\n", 0, cut + 1), text.rfind(" ", 0, cut + 1))
+        if space > limit // 2:
+            parts.append(text[:space])
+            text = text[space + 1:]
+        else:
+            parts.append(text[:cut])
+            text = text[cut:]
+    parts.append(text)
+    return parts
+
+
+# ==================== отложенная отправка ====================
+
+class DelayedSends:
+    """Отложенные репосты: одна задача и куча по сроку вместо sleep в каждом on_message.
+
+    В записи только то, что нужно для отправки (срок, порядковый номер,
+    канал, имя, аватар, части, id исходного сообщения для отката), без
+    объекта сообщения. Всё, чему подошёл срок, уходит пачкой по порядку.
+    """
+
+    def __init__(self):
+        self.heap: list[tuple[float, int, int, str, str, tuple[str, ...], int]] = []
+        self.seq = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.stopping = False
+
+    @property
+    def pending(self) -> int:
+        return len(self.heap)
+
+    def schedule(
+        self, delay: float, channel_id: int, username: str, avatar_url: str, parts: list[str], source_id: int
+    ):
+        record = (time.monotonic() + delay, next(self.seq), channel_id, username, avatar_url, tuple(parts), source_id)
+        heapq.heappush(self.heap, record)
+        if self.stopping:
+            # идёт выключение: запись заберёт drain
+            return
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        elif self.heap[0] is record:
+            # новый срок раньше того, которого ждёт задача
+            self.wakeup.set()
+
+    def cancel(self, source_id: int) -> int:
+        """Снимает ещё не ушедшие отправки исходного сообщения (откат репоста)"""
+        kept = [record for record in self.heap if record[6] != source_id]
+        dropped = len(self.heap) - len(kept)
+        if dropped:
+            heapq.heapify(kept)
+            self.heap = kept
+        return dropped
+
+    async def _run(self):
+        while self.heap and not self.stopping:
+            delay = self.heap[0][0] - time.monotonic()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.monotonic()
+            batch = []
+            while self.heap and self.heap[0][0] <= now:
+                batch.append(heapq.heappop(self.heap))
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple]):
+        # задачи создаются по порядку, значит и в очередь вебхуков встают по порядку
+        sends = []
+        for _, _, channel_id, username, avatar_url, parts, _ in batch:
+            channel = bot.get_channel(channel_id)
+            if channel is None:
+                logger.warning("Delayed send dropped: channel %s not found", channel_id)
+                continue
+            sends.append(asyncio.create_task(post_parts(outbox_for(channel), username, avatar_url, parts)))
+        for result in await asyncio.gather(*sends, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error("Delayed send failed: %s", result)
+
+    async def drain(self, timeout: float = 10.0):
+        """Отправляет всё, что ждёт, не дожидаясь сроков (при выключении).
+
+        Задачу не отменяем: записи идущей пачки уже сняты с кучи и пропали
+        бы вместе с ней. Она дописывает пачку и выходит по флагу, остаток
+        кучи уходит одной пачкой следом.
+        """
+        self.stopping = True
+        self.wakeup.set()
+        try:
+            await asyncio.wait_for(self._finish(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Timed out draining delayed sends")
+
+    async def _finish(self):
+        if self.task is not None:
+            await self.task
+        if not self.heap:
+            return
+        logger.info("Draining %s delayed sends", self.pending)
+        batch = [heapq.heappop(self.heap) for _ in range(len(self.heap))]
+        await self._flush(batch)
+
+
+delayed_sends = DelayedSends()
+metrics.gauge("delayed_sends_pending", lambda: delayed_sends.pending)
+
+
+# ==================== анонимная очередь ====================
+
+EMBEDS_PER_MESSAGE = 10
+EMBED_TOTAL_LIMIT = 6000
+
+
+class AnonymousDispatch:
+    """Склейка анонимных эмбедов одного канала в общие сообщения.
+
+    Всё, что пришло, пока в канале нет тишины в ANONYMOUS["window_seconds"],
+    уходит одним сообщением - до 10 эмбедов и 6000 символов на сообщение.
+    Первый в пачке ждёт не дольше ANONYMOUS["max_latency_seconds"]. Очередь
+    не ограничена жёстко: full - сигнал для /send, что пора притормозить.
+    """
+
+    def __init__(self, channel: discord.TextChannel):
+        self.channel = channel
+        self.pending: collections.deque[tuple[discord.Embed, asyncio.Future, float]] = collections.deque()
+        self.last_at = 0.0
+        self.wakeup = asyncio.Event()
+        self.worker: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self.pending)
+
+    @property
+    def full(self) -> bool:
+        return len(self.pending) >= ANONYMOUS["max_pending"]
+
+    def submit(self, embed: discord.Embed) -> asyncio.Future:
+        """Ставит эмбед в очередь; future получит сообщение, в котором он ушёл"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.last_at = loop.time()
+        self.pending.append((embed, future, self.last_at))
+        self.wakeup.set()
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            first_at = self.pending[0][2]
+            while len(self.pending) < EMBEDS_PER_MESSAGE:
+                deadline = min(
+                    first_at + ANONYMOUS["max_latency_seconds"],
+                    self.last_at + ANONYMOUS["window_seconds"],
+                )
+                delay = deadline - loop.time()
+                if delay <= 0:
+                    break
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [self.pending.popleft()]
+            size = len(batch[0][0])
+            while self.pending and len(batch) < EMBEDS_PER_MESSAGE:
+                next_size = len(self.pending[0][0])
+                if size + next_size > EMBED_TOTAL_LIMIT:
+                    break
+                size += next_size
+                batch.append(self.pending.popleft())
+
+            try:
+                with metrics.timer("anonymous_send"):
+                    message = await self.channel.send(embeds=[embed for embed, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                metrics.inc("anonymous_embeds", len(batch))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_result(message)
+
+
+anonymous_dispatch: dict[int, AnonymousDispatch] = {}   # по каналам
+
+def dispatch_for(channel: discord.TextChannel) -> AnonymousDispatch:
+    dispatch = anonymous_dispatch.get(channel.id)
+    if dispatch is None:
+        dispatch = anonymous_dispatch[channel.id] = AnonymousDispatch(channel)
+    return dispatch
+
+metrics.gauge(
+    "anonymous_queue_depth",
+    lambda: {(("channel", str(channel_id)),): d.depth for channel_id, d in anonymous_dispatch.items()},
+)
 
-@tasks.loop(hours=WIZARD["interval_hours"])
-async def wizard_cycle():
-    global active_effect, effect_end_time
 
-    try:
-        channel = bot.get_channel(WIZARD_CHANNEL)
-        if channel is None:
-            logger.error(f"Wizard channel {WIZARD_CHANNEL} not found")
-            return
+# ==================== отправка ====================
+
+# Отправители возвращают уже отправленные сообщения - их удаляют при откате
+
+async def post_parts(outbox: WebhookOutbox, username: str, avatar_url: str, parts) -> list[discord.Message]:
+    # части строго по очереди, иначе пул вебхуков может их перемешать
+    sent = []
+    for part in parts:
+        sent.append(await outbox.send(content=part, username=username, avatar_url=avatar_url, wait=True))
+    return sent
+
+async def send_webhook(message: discord.Message, parts: list[str], outbox: WebhookOutbox | None) -> list[discord.Message]:
+    return await post_parts(outbox, message.author.display_name, message.author.display_avatar.url, parts)
+
+async def send_embed(message: discord.Message, parts: list[str], outbox: WebhookOutbox | None) -> list[discord.Message]:
+    dispatch = dispatch_for(message.channel)
+    futures = []
+    for part in parts:
+        embed = discord.Embed(description=part, color=random.choice(COLORS))
+        embed.set_author(name=GUILDS[message.guild.id].anonymous_format)
+        futures.append(dispatch.submit(embed))
+    await asyncio.gather(*futures)
+    # в сообщениях могут быть чужие эмбеды - откатывать их нельзя
+    return []
+
+async def send_delayed(message: discord.Message, parts: list[str], outbox: WebhookOutbox | None) -> list[discord.Message]:
+    delayed_sends.schedule(
+        GUILDS[message.guild.id].delay_seconds,
+        message.channel.id,
+        message.author.display_name,
+        message.author.display_avatar.url,
+        parts,
+        message.id,
+    )
+    return []
+
+async def send_double(message: discord.Message, parts: list[str], outbox: WebhookOutbox | None) -> list[discord.Message]:
+    sent = await send_webhook(message, parts, outbox)
+    # второй раз - через планировщик, обработчик не ждёт полсекунды;
+    # не удалился оригинал - rollback снимет копию по message.id
+    delayed_sends.schedule(
+        0.5,
+        message.channel.id,
+        message.author.display_name,
+        message.author.display_avatar.url,
+        parts,
+        message.id,
+    )
+    return sent
+
+SENDERS = {
+    "webhook": send_webhook,
+    "embed": send_embed,
+    "delay": send_delayed,
+    "double": send_double,
+}
+
+# concurrent   - удаление и отправка параллельно, около одного запроса до репоста;
+#                если отправка упала, оригинал уже удалён и сообщение теряется
+# send_first   - сначала отправка, удаление только после успеха: ничего не теряется
+# delete_first - как раньше: удаление, затем отправка
+REPOST_POLICIES = ("concurrent", "send_first", "delete_first")
+
+
+def check_send(effect: Effect) -> None:
+    """Проверка эффекта при загрузке его модуля: стратегия отправки должна существовать"""
+    if effect.send is not None and effect.send not in SENDERS:
+        raise ConfigError(f"Effect {effect.name} has unknown send strategy: {effect.send}")
+
+def validate_effects(guilds: dict[int, GuildConfig], webhooks: dict) -> None:
+    """Проверяет, что каждый эффект из конфига (и из оверлеев серверов) реализован.
+
+    Модули эффектов здесь не импортируются: достаточно имени в реестре,
+    остальное проверит check_send при первом выборе эффекта.
+    """
+    for guild in guilds.values():
+        missing = [name for name in guild.effects if name not in EFFECTS]
+        if missing:
+            raise ConfigError(f"Effects configured for guild {guild.id} but not implemented: {', '.join(missing)}")
+    # уже загруженные (стопки хаоса и их части) проверяем сразу
+    for effect in EFFECTS.loaded.values():
+        check_send(effect)
+    if webhooks["repost_policy"] not in REPOST_POLICIES:
+        raise ConfigError(f"Unknown webhooks.repost_policy: {webhooks['repost_policy']}")
+    if webhooks["overflow"] not in ("split", "truncate"):
+        raise ConfigError(f"Unknown webhooks.overflow: {webhooks['overflow']}")
 
-        effects = list(WIZARD["effects"].keys())
-        if not effects:
-            logger.error("No effects defined in config")
-            return
+try:
+    validate_effects(GUILDS, WEBHOOKS)
+except ConfigError as e:
+    logger.critical("%s", e)
+    exit(1)
+EFFECTS.check = check_send
 
-        chosen = random.choice(effects)
-        effect_data = WIZARD["effects"].get(chosen, {})
-        duration = WIZARD["duration_minutes"]
 
-        active_effect = chosen
-        effect_end_time = time.time() + (duration * 60)
+# ==================== применение эффекта ====================
+
+BULK_DELETE_LIMIT = 100
+
+@metrics.timed("message_delete")
+async def delete_message(message: discord.Message):
+    await message.delete()
+
+async def delete_originals(message: discord.Message, batch: list[discord.Message] | None):
+    """Оригинал или пачка слитых повторов флуда - одним запросом"""
+    if not batch:
+        await delete_message(message)
+        return
+    with metrics.timer("message_bulk_delete"):
+        await message.channel.delete_messages(batch)
+
+async def rollback(message: discord.Message, sent: list[discord.Message]):
+    """Убирает репост, если оригинал удалить не вышло: и отправленный, и ещё ждущий в планировщике"""
+    if delayed_sends.cancel(message.id):
+        logger.info("Delayed repost of %s cancelled by rollback", message.id)
+    for repost in sent:
+        try:
+            await delete_message(repost)
+        except Exception as e:
+            logger.warning("Failed to roll back repost %s: %s", repost.id, e)
+
+async def repost(
+    message: discord.Message,
+    spec: Effect,
+    parts: list[str],
+    outbox: WebhookOutbox | None,
+    batch: list[discord.Message] | None = None,
+):
+    """Удаляет оригинал и отправляет результат по политике webhooks.repost_policy"""
+    sender = SENDERS[spec.send]
+    policy = WEBHOOKS["repost_policy"]
+
+    if not spec.needs_delete:
+        await sender(message, parts, outbox)
+        return
+    if policy == "delete_first" or not spec.pipelined:
+        await delete_originals(message, batch)
+        await sender(message, parts, outbox)
+        return
+
+    if policy == "send_first":
+        sent = await sender(message, parts, outbox)
+        (deleted,) = await asyncio.gather(delete_originals(message, batch), return_exceptions=True)
+    else:
+        deleted, sent = await asyncio.gather(
+            delete_originals(message, batch), sender(message, parts, outbox), return_exceptions=True
+        )
+        if isinstance(sent, BaseException):
+            if not isinstance(deleted, BaseException):
+                logger.error("Repost failed after the original was deleted in %s", message.channel.id)
+            raise sent
+
+    if isinstance(deleted, BaseException):
+        # оригинал остался или его уже удалил автор - репост не нужен
+        await rollback(message, sent)
+        raise deleted
+
+async def apply_effect(
+    message: discord.Message, effect: str, original: str, batch: list[discord.Message] | None = None
+) -> bool:
+    """Применяет эффект к сообщению. Возвращает True если обработано.
+
+    batch - слитые повторы флуда вместе с message: удаляются пачкой,
+    а к репосту дописывается ×N.
+    """
+    with metrics.timer("effect", effect=effect):
+        try:
+            spec = EFFECTS.get(effect)
+            if spec is None or spec.send is None:
+                return False
+
+            if spec.transform:
+                new_content = await transform_executor.transform(spec, original)
+            else:
+                new_content = original
+            suffix = f" ×{len(batch)}" if batch else ""
+            new_content += suffix
+            # размер проверяем до удаления: лишнее режем, а не теряем сообщение на 400-м ответе
+            if spec.needs_webhook and spec.max_size(len(original)) + len(suffix) > WEBHOOKS["max_length"]:
+                parts = fit_message(new_content)
+            else:
+                parts = [new_content]
+
+            outbox = outbox_for(message.channel) if spec.needs_webhook else None
+            await repost(message, spec, parts, outbox, batch)
+            return True
+
+        except discord.NotFound:
+            logger.warning("Message already deleted for effect %s", effect)
+            return True
+        except discord.Forbidden as e:
+            logger.error("Permission error in effect %s: %s", effect, e)
+            metrics.inc("effect_errors", effect=effect)
+            return False
+        except Exception as e:
+            logger.exception("Error applying effect %s: %s", effect, e)
+            metrics.inc("effect_errors", effect=effect)
+            return False
 
-        logger.info(f"Wizard effect started: {chosen} for {duration} minutes")
 
-        # slowmode
-        if chosen in ("slowmode", "mega_slowmode"):
+# ==================== склейка флуда ====================
+
+@dataclass
+class FloodRun:
+    """Серия одинаковых сообщений одного автора"""
+    effect: str
+    content: str
+    last_at: float
+    first_held_at: float = 0.0
+    held: list[discord.Message] = dataclasses.field(default_factory=list)
+    handle: asyncio.TimerHandle | None = None
+
+class FloodGate:
+    """Склейка флуда в канале колдуна перед apply_effect.
+
+    Первое сообщение серии обрабатывается как обычно. Повторы того же
+    текста от того же автора, пока между ними меньше FLOOD["window_seconds"],
+    придерживаются и уходят одним репостом "текст ×N", а оригиналы
+    удаляются одним bulk delete. Пачка ждёт не дольше
+    FLOOD["max_latency_seconds"] и не больше BULK_DELETE_LIMIT сообщений.
+    Серии живут в LRU по авторам размером FLOOD["max_authors"].
+    """
+
+    def __init__(self):
+        self.runs: collections.OrderedDict[tuple[int, int], FloodRun] = collections.OrderedDict()
+
+    @property
+    def held(self) -> int:
+        return sum(len(run.held) for run in self.runs.values())
+
+    def hold(self, message: discord.Message, effect: str, content: str) -> bool:
+        """True - сообщение придержано как повтор и обработается пачкой"""
+        now = asyncio.get_running_loop().time()
+        key = (message.guild.id, message.author.id)
+        run = self.runs.get(key)
+        if (
+            run is not None
+            and run.effect == effect
+            and run.content == content
+            and now - run.last_at <= FLOOD["window_seconds"]
+        ):
+            self.runs.move_to_end(key)
+            run.last_at = now
+            if not run.held:
+                run.first_held_at = now
+            run.held.append(message)
+            if len(run.held) >= BULK_DELETE_LIMIT:
+                self._flush(run)
+            else:
+                self._schedule(run)
+            return True
+
+        if run is not None:
+            self._flush(run)
+        self.runs[key] = FloodRun(effect, content, now)
+        self.runs.move_to_end(key)
+        while len(self.runs) > FLOOD["max_authors"]:
+            _, evicted = self.runs.popitem(last=False)
+            self._flush(evicted)
+        return False
+
+    def flush_guild(self, guild_id: int):
+        """Окно колдуна закрылось: придержанное уходит сразу, серии забываются"""
+        for key in [key for key in self.runs if key[0] == guild_id]:
+            self._flush(self.runs.pop(key))
+
+    def drop(self, guild_id: int):
+        """Забывает серии сервера, придержанное остаётся в канале как есть"""
+        for key in [key for key in self.runs if key[0] == guild_id]:
+            run = self.runs.pop(key)
+            if run.handle is not None:
+                run.handle.cancel()
+
+    def _schedule(self, run: FloodRun):
+        if run.handle is not None:
+            run.handle.cancel()
+        deadline = min(run.last_at + FLOOD["window_seconds"], run.first_held_at + FLOOD["max_latency_seconds"])
+        run.handle = asyncio.get_running_loop().call_at(deadline, self._flush, run)
+
+    def _flush(self, run: FloodRun):
+        if run.handle is not None:
+            run.handle.cancel()
+            run.handle = None
+        if not run.held:
+            return
+        held, run.held = run.held, []
+        metrics.inc("flood_coalesced", len(held), effect=run.effect)
+        if len(held) == 1:
+            spawn(apply_effect(held[0], run.effect, run.content))
+        else:
+            spawn(apply_effect(held[-1], run.effect, run.content, held))
+
+flood = FloodGate()
+metrics.gauge("flood_held", lambda: flood.held)
+
+
+# ==================== состояние колдуна ====================
+
+class WizardState:
+    """Окно эффекта колдуна одного сервера: idle -> active -> ending -> idle.
+
+    Горячий путь читает только active (None вне окна). Конец окна - колбэк
+    loop.call_at на монотонных часах цикла, так что ни сообщения, ни цикл
+    колдуна не сверяют время сами. На диске - снимок из одной строки:
+    эффект, настенное время конца и признак slowmode. По нему после
+    рестарта recover() за один шаг либо продолжает окно, либо снимает
+    slowmode и закрывает его.
+    """
+
+    IDLE = "idle"
+    ACTIVE = "active"
+    ENDING = "ending"
+
+    def __init__(self, conn: sqlite3.Connection, guild: GuildConfig):
+        self.conn = conn
+        self.guild = guild
+        self.cycle: tasks.Loop | None = None
+        self.phase = self.IDLE
+        self.active: str | None = None
+        self.deadline: float = 0.0                  # loop.time(), монотонное
+        self.end_handle: asyncio.TimerHandle | None = None
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS wizard_state ("
+                "channel_id INTEGER PRIMARY KEY, effect TEXT NOT NULL, "
+                "ends_at REAL NOT NULL, slowmode INTEGER NOT NULL)"
+            )
+
+    @property
+    def remaining(self) -> float:
+        if self.phase != self.ACTIVE:
+            return 0.0
+        return max(0.0, self.deadline - asyncio.get_running_loop().time())
+
+    async def begin(self, channel: discord.TextChannel, effect: str, seconds: float):
+        """Открывает окно эффекта и планирует его конец"""
+        slowmode = EFFECTS[effect].slowmode
+        # снимок пишется до slowmode: упадём между ними - recover() его снимет
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO wizard_state (channel_id, effect, ends_at, slowmode) VALUES (?, ?, ?, ?)",
+                (channel.id, effect, time.time() + seconds, int(slowmode)),
+            )
+        self._open(channel.id, effect, seconds, slowmode)
+        logger.info("Wizard effect started in guild %s: %s for %g minutes", self.guild.id, effect, seconds / 60)
+
+        if slowmode:
             try:
-                slowmode_sec = effect_data.get("slowmode_seconds", 30)
+                slowmode_sec = self.guild.slowmode_seconds.get(effect, 30)
                 await channel.edit(slowmode_delay=slowmode_sec)
-                logger.info(f"Slowmode set to {slowmode_sec} seconds")
+                logger.info("Slowmode set to %s seconds", slowmode_sec)
             except Exception as e:
-                logger.error(f"Failed to set slowmode: {e}")
+                logger.error("Failed to set slowmode: %s", e)
 
-        # объявление
         try:
             embed = discord.Embed(
-                title=WIZARD["announcement_title"],
+                title=self.guild.announcement_title,
                 color=random.choice(COLORS),
             )
             await channel.send(embed=embed)
         except Exception as e:
-            logger.error(f"Failed to send wizard announcement: {e}")
+            logger.error("Failed to send wizard announcement: %s", e)
+
+    async def recover(self):
+        """Шаг запуска: продолжить окно из снимка или прибрать за ним"""
+        row = self.conn.execute(
+            "SELECT channel_id, effect, ends_at, slowmode FROM wizard_state WHERE channel_id = ?",
+            (self.guild.wizard_channel,),
+        ).fetchone()
+        if row is None:
+            return
+        channel_id, effect, ends_at, slowmode = row
+        left = ends_at - time.time()
+        if left > 0 and effect in EFFECTS and load_effect(effect) is not None:
+            self._open(channel_id, effect, left, bool(slowmode))
+            logger.info("Wizard effect resumed in guild %s: %s, %.0fs left", self.guild.id, effect, left)
+        else:
+            logger.info("Wizard effect %s expired while offline, cleaning up", effect)
+            self.phase = self.ENDING
+            await self._finish(channel_id, effect, bool(slowmode))
+
+    def _open(self, channel_id: int, effect: str, seconds: float, slowmode: bool):
+        loop = asyncio.get_running_loop()
+        if self.end_handle is not None:
+            self.end_handle.cancel()
+        self.deadline = loop.time() + seconds
+        self.end_handle = loop.call_at(self.deadline, self._expire, channel_id, effect, slowmode)
+        self.phase = self.ACTIVE
+        self.active = effect
+
+    def _expire(self, channel_id: int, effect: str, slowmode: bool):
+        # с этого момента on_message уже не трогает сообщения
+        self.active = None
+        self.end_handle = None
+        self.phase = self.ENDING
+        # придержанный флуд окна уходит сейчас, а не по своему таймеру после конца
+        flood.flush_guild(self.guild.id)
+        spawn(self._finish(channel_id, effect, slowmode))
+
+    async def _finish(self, channel_id: int, effect: str, slowmode: bool):
+        try:
+            channel = bot.get_channel(channel_id)
+            if channel is None:
+                logger.error("Wizard channel %s not found", channel_id)
+            else:
+                if slowmode:
+                    try:
+                        await channel.edit(slowmode_delay=0)
+                        logger.info("Slowmode removed")
+                    except Exception as e:
+                        logger.error("Failed to remove slowmode: %s", e)
+
+                try:
+                    end_embed = discord.Embed(
+                        description=self.guild.effect_ended,
+                        color=0x00FF00,
+                    )
+                    await channel.send(embed=end_embed)
+                except Exception as e:
+                    logger.error("Failed to send end announcement: %s", e)
+
+            logger.info("Wizard effect ended in guild %s: %s", self.guild.id, effect)
+        finally:
+            with self.conn:
+                self.conn.execute("DELETE FROM wizard_state WHERE channel_id = ?", (channel_id,))
+            self.phase = self.IDLE
+
+
+# по каналу колдуна: on_message находит состояние одним поиском в словаре
+wizards: dict[int, WizardState] = {g.wizard_channel: WizardState(db, g) for g in GUILDS.values()}
 
-        # ждём окончания
-        await asyncio.sleep(duration * 60)
 
-        # снятие
-        active_effect = None
-        effect_end_time = 0
+# ==================== колдун таск =========================
 
-        if chosen in ("slowmode", "mega_slowmode"):
-            try:
-                await channel.edit(slowmode_delay=0)
-                logger.info("Slowmode removed")
-            except Exception as e:
-                logger.error(f"Failed to remove slowmode: {e}")
+def load_effect(name: str) -> Effect | None:
+    """Эффект из реестра или None, если его модуль не грузится.
 
-        # объявление о конце
-        try:
-            end_embed = discord.Embed(
-                description=WIZARD["messages"]["effect_ended"],
-                color=0x00FF00,
-            )
-            await channel.send(embed=end_embed)
-        except Exception as e:
-            logger.error(f"Failed to send end announcement: {e}")
+    Модули импортируются при первом выборе, поэтому сломанный плагин
+    всплывает здесь, а не при старте: такой эффект пропускается.
+    """
+    try:
+        return EFFECTS[name]
+    except Exception as e:
+        logger.error("Effect %s failed to load: %s", name, e)
+        return None
 
-        logger.info(f"Wizard effect ended: {chosen}")
+async def wizard_cycle(state: WizardState):
+    try:
+        if state.phase != WizardState.IDLE:
+            # окно, продолженное после рестарта, ещё не закрылось
+            logger.info("Wizard cycle skipped in guild %s: effect %s is %s", state.guild.id, state.active, state.phase)
+            return
+
+        channel = bot.get_channel(state.guild.wizard_channel)
+        if channel is None:
+            logger.error("Wizard channel %s not found", state.guild.wizard_channel)
+            return
+
+        effects = state.guild.effects
+        if not effects:
+            logger.error("No effects defined for guild %s", state.guild.id)
+            return
+
+        chaos = CHAOS_EFFECTS[state.guild.id]
+        if chaos and random.random() < state.guild.chaos_chance:
+            chosen = random.choice(chaos)
+        else:
+            # не загрузился - пробуем другой, интервал колдуна не пропадает
+            candidates = list(effects)
+            while True:
+                chosen = candidates.pop(random.randrange(len(candidates)))
+                if load_effect(chosen) is not None:
+                    break
+                if not candidates:
+                    logger.error("No effect could be loaded for guild %s", state.guild.id)
+                    return
+
+        await state.begin(channel, chosen, state.guild.duration_minutes * 60)
 
     except Exception as e:
-        logger.error(f"Wizard cycle error: {e}\n{traceback.format_exc()}")
-        active_effect = None
-        effect_end_time = 0
+        logger.exception("Wizard cycle error in guild %s: %s", state.guild.id, e)
 
 
-@wizard_cycle.before_loop
-async def before_wizard():
-    await bot.wait_until_ready()
-    logger.info("Wizard cycle ready to start")
+async def start_wizards():
+    """Запускает колдуна на серверах, которые видит этот процесс.
+
+    Остальные сервера из конфига принадлежат чужим шардам. Восстановление
+    окна после рестарта - часть того же шага, до первого тика цикла.
+    """
+    for state in wizards.values():
+        if state.cycle is not None or bot.get_guild(state.guild.id) is None:
+            continue
+        try:
+            await state.recover()
+        except Exception as e:
+            logger.exception("Wizard recovery error in guild %s: %s", state.guild.id, e)
+        state.cycle = tasks.loop(hours=state.guild.interval_hours)(wizard_cycle)
+        state.cycle.start(state)
+        logger.info("Wizard cycle started in guild %s", state.guild.id)
 
 
 # ==================== обработка сообщений ==================
 
 @bot.event
+@metrics.timed("on_message")
 async def on_message(message: discord.Message):
     try:
         if message.author.bot:
             return
 
         # эффекты только в одном канале
-        if message.channel.id != WIZARD_CHANNEL or active_effect is None:
-            await bot.process_commands(message)
-            return
-
-        if time.time() > effect_end_time:
+        state = wizards.get(message.channel.id)
+        effect = state.active if state is not None else None
+        if effect is None:
             await bot.process_commands(message)
             return
 
@@ -809,13 +2005,17 @@ async def on_message(message: discord.Message):
             await bot.process_commands(message)
             return
 
-        handled = await apply_effect(message, active_effect, original)
+        spec = EFFECTS.get(effect)
+        if spec is not None and spec.send is not None and flood.hold(message, effect, original):
+            return
+
+        handled = await apply_effect(message, effect, original)
 
         if not handled:
             await bot.process_commands(message)
 
     except Exception as e:
-        logger.error(f"on_message error: {e}\n{traceback.format_exc()}")
+        logger.exception("on_message error: %s", e)
         try:
             await bot.process_commands(message)
         except Exception:
@@ -826,12 +2026,12 @@ async def on_message(message: discord.Message):
 
 @bot.event
 async def on_error(event: str, *args, **kwargs):
-    logger.error(f"Error in {event}: {traceback.format_exc()}")
+    logger.exception("Error in %s", event)
 
 
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    logger.error(f"App command error: {error}\n{traceback.format_exc()}")
+    logger.exception("App command error: %s", error)
     try:
         if interaction.response.is_done():
             await interaction.followup.send("An error occurred.", ephemeral=True)
@@ -841,20 +2041,85 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
         pass
 
 
-# ======================== events ==========================
+# ==================== эндпоинт метрик ====================
 
-@bot.event
-async def on_ready():
-    logger.info(f"{bot.user.name} is online!")
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=metrics.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def serve_metrics() -> web.AppRunner | None:
+    """Поднимает /metrics на METRICS host:port (port 0 - выключено)"""
+    if not METRICS["port"]:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS["host"], METRICS["port"]).start()
+    logger.info("Metrics served on http://%s:%s/metrics", METRICS["host"], METRICS["port"])
+    return runner
+
+
+@tasks.loop(minutes=METRICS["summary_minutes"])
+async def metrics_summary():
+    text = metrics.summary()
+    if text:
+        logger.info("Metrics: %s", text)
+
+
+# ==================== синхронизация команд ====================
+
+def command_fingerprint() -> str:
+    """Хэш дерева команд в том виде, в каком его получает Discord"""
+    payload = sorted(
+        (command.to_dict(bot.tree) for command in bot.tree.get_commands()),
+        key=lambda c: (c.get("type", 1), c["name"]),
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+async def sync_commands():
+    """Глобальная синхронизация команд, только если дерево изменилось.
+
+    on_ready приходит и после каждого переподключения, а sync - медленный
+    запрос с жёстким лимитом. Отпечаток последнего успешного sync лежит
+    в kv-таблице, FORCE_SYNC=1 синхронизирует в любом случае.
+    """
+    key = f"command_tree:{bot.application_id}"
+    fingerprint = command_fingerprint()
+    force = os.getenv("FORCE_SYNC", "").strip().lower() in ("1", "true", "yes")
+    if not force and kv_get(key) == fingerprint:
+        logger.info("Command tree unchanged, sync skipped")
+        return
+
+    start = time.perf_counter()
     try:
         synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} commands")
     except Exception as e:
-        logger.error(f"Sync error: {e}")
+        logger.error("Sync error after %.2fs: %s", time.perf_counter() - start, e)
+        return
+    kv_set(key, fingerprint)
+    logger.info("Synced %s commands in %.2fs", len(synced), time.perf_counter() - start)
+
+
+# ======================== events ==========================
+
+@bot.event
+async def on_ready():
+    logger.info("%s is online!", bot.user.name)
+    start = time.perf_counter()
+    await sync_commands()
+    await start_wizards()
+    logger.info("Ready handling took %.2fs", time.perf_counter() - start)
+
 
-    if not wizard_cycle.is_running():
-        wizard_cycle.start()
-        logger.info("Wizard cycle started")
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    drop_guild(guild.id)
+    logger.info("Left guild %s, dropped its webhook queues", guild.id)
 
 
 @bot.event
@@ -869,73 +2134,204 @@ async def on_resumed():
 
 # ===================== /send ==============================
 
+async def dismiss(interaction: discord.Interaction):
+    """Убирает ответ на команду, будто его и не было"""
+    try:
+        if not interaction.response.is_done():
+            await interaction.response.defer(ephemeral=True)
+        await interaction.delete_original_response()
+    except Exception:
+        pass
+
+
 @bot.tree.command(
     name=CMD["send"]["name"],
     description=CMD["send"]["description"],
 )
 @app_commands.describe(message=CMD["send"]["option_description"])
+@metrics.timed("send_command")
 async def send_message(interaction: discord.Interaction, message: str):
     try:
         user_id = interaction.user.id
         now = time.time()
+        # из ЛС (или с чужого сервера) - в основной сервер, как раньше
+        config_guild = GUILDS.get(interaction.guild_id) or GUILDS[GUILD_ID]
+        cooldowns = user_cooldowns[config_guild.id]
 
-        if user_id in user_cooldowns:
-            passed = now - user_cooldowns[user_id]
-            if passed < COOLDOWN:
-                remaining = COOLDOWN - passed
-                await interaction.response.send_message(
-                    MSGS["cooldown"].format(
-                        minutes=int(remaining // 60),
-                        seconds=int(remaining % 60),
-                    ),
-                    ephemeral=True,
-                )
-                return
-
-        await interaction.response.defer(ephemeral=True)
+        remaining = cooldowns.remaining(user_id, now)
+        if remaining > 0:
+            await interaction.response.send_message(
+                MSGS["cooldown"].format(
+                    minutes=int(remaining // 60),
+                    seconds=int(remaining % 60),
+                ),
+                ephemeral=True,
+            )
+            return
 
-        guild = bot.get_guild(GUILD_ID)
-        channel = bot.get_channel(CHANNEL_ID)
+        guild = bot.get_guild(config_guild.id)
+        channel = bot.get_channel(config_guild.anonymous_channel)
 
         if guild is None or channel is None:
-            logger.error(f"Guild {GUILD_ID} or channel {CHANNEL_ID} not found")
-            try:
-                await interaction.delete_original_response()
-            except Exception:
-                pass
+            logger.error("Guild %s or channel %s not found", config_guild.id, config_guild.anonymous_channel)
+            await dismiss(interaction)
             return
 
         if guild.get_member(user_id) is None:
-            logger.warning(f"User {user_id} not a member of guild {GUILD_ID}")
-            try:
-                await interaction.delete_original_response()
-            except Exception:
-                pass
+            logger.warning("User %s not a member of guild %s", user_id, config_guild.id)
+            await dismiss(interaction)
+            return
+
+        dispatch = dispatch_for(channel)
+        if dispatch.full:
+            await interaction.response.send_message(MSGS["send_busy"], ephemeral=True)
             return
+        # в ближайшее сообщение не влезет - пусть человек видит, что он в очереди
+        if dispatch.depth >= EMBEDS_PER_MESSAGE:
+            await interaction.response.send_message(
+                MSGS["send_queued"].format(position=dispatch.depth + 1),
+                ephemeral=True,
+            )
+        else:
+            await interaction.response.defer(ephemeral=True)
 
         embed = discord.Embed(
             description=message,
             color=random.choice(COLORS),
         )
-        await channel.send(embed=embed)
-        user_cooldowns[user_id] = now
-        logger.info(f"Anonymous message sent by user {user_id}")
-
+        # кулдаун сразу, чтобы не успели накидать ещё, пока ждём очередь
+        cooldowns.start(user_id, now)
         try:
-            await interaction.delete_original_response()
+            await dispatch.submit(embed)
         except Exception:
-            pass
+            cooldowns.cancel(user_id)
+            raise
+        logger.info("Anonymous message sent by user %s", user_id)
+        await dismiss(interaction)
 
     except Exception as e:
-        logger.error(f"/send error: {e}\n{traceback.format_exc()}")
-        try:
-            await interaction.delete_original_response()
-        except Exception:
-            pass
+        logger.exception("/send error: %s", e)
+        await dismiss(interaction)
 
 
 # ===================== /prison ============================
 
+MEMBER_ID_RE = re.compile(r"\d{15,21}")
+
+prison_slots: dict[int, asyncio.Semaphore] = {}   # сервер -> одновременные member.edit
+
+
+def prison_slot(guild_id: int) -> asyncio.Semaphore:
+    slot = prison_slots.get(guild_id)
+    if slot is None:
+        slot = prison_slots[guild_id] = asyncio.Semaphore(PRISON["concurrency"])
+    return slot
+
+
+async def resolve_targets(
+    interaction: discord.Interaction,
+    target: discord.User,
+    others: str | None,
+) -> tuple[discord.Guild, GuildConfig, list[discord.Member], list[str]] | None:
+    """Проверяет права и собирает участников из target и упоминаний/ID в others.
+
+    Если ответить уже пришлось (нет сервера или прав) - возвращает None.
+    """
+    config_guild = GUILDS.get(interaction.guild_id) or GUILDS[GUILD_ID]
+    guild = bot.get_guild(config_guild.id)
+    if guild is None:
+        await interaction.response.send_message(MSGS["prison_fail"], ephemeral=True)
+        return None
+
+    caller = guild.get_member(interaction.user.id)
+    if caller is None or not any(r.id == config_guild.staff_role for r in caller.roles):
+        await interaction.response.send_message(MSGS["no_permission"], ephemeral=True)
+        return None
+
+    ids = [target.id] + [int(x) for x in MEMBER_ID_RE.findall(others or "")]
+    ids = list(dict.fromkeys(ids))[:PRISON["max_targets"]]
+    members, missing = [], []
+    for user_id in ids:
+        member = guild.get_member(user_id)
+        if member is None:
+            missing.append(f"<@{user_id}>: {MSGS['target_not_member']}")
+        else:
+            members.append(member)
+
+    if not members:
+        await interaction.response.send_message("\n".join(missing), ephemeral=True)
+        return None
+    return guild, config_guild, members, missing
+
+
+async def imprison_one(
+    guild: discord.Guild,
+    config_guild: GuildConfig,
+    member: discord.Member,
+    audit_reason: str,
+) -> str:
+    """Сажает одного участника одним member.edit, возвращает строку отчёта"""
+    if prisoners.get(guild.id, member.id) is not None:
+        return MSGS["prison_already"].format(target=member.mention)
+
+    # управляемые роли (бусты, интеграции) снять нельзя - они остаются
+    kept = [r for r in member.roles if r.managed]
+    prior = [r.id for r in member.roles if not r.is_default() and not r.managed]
+    prisoner_role = guild.get_role(config_guild.prisoner_role)
+    if prisoner_role is not None and prisoner_role not in kept:
+        kept.append(prisoner_role)
+
+    # запись до вызова: упадём посередине - прежние роли всё равно не потеряются
+    number = prisoners.admit(guild.id, member.id, member.nick, prior)
+    if number is None:
+        return f"{member.mention}: {MSGS['prison_fail']}"
+    new_nick = MSGS["prison_nickname_format"].format(number=f"{number:04d}")
+
+    try:
+        async with prison_slot(guild.id):
+            await member.edit(nick=new_nick, roles=kept, reason=audit_reason)
+    except Exception as e:
+        prisoners.release(guild.id, member.id)
+        logger.warning("Cannot imprison %s: %s", member.id, e)
+        return f"{member.mention}: {MSGS['prison_fail']}"
+
+    logger.info("User %s imprisoned as %s", member.id, new_nick)
+    return MSGS["prison_success"].format(target=member.mention, new_nick=new_nick)
+
+
+async def release_one(guild: discord.Guild, member: discord.Member, audit_reason: str) -> str:
+    """Возвращает ник и роли из реестра одним member.edit"""
+    record = prisoners.get(guild.id, member.id)
+    if record is None:
+        return MSGS["release_not_prisoner"].format(target=member.mention)
+    _, nick, role_ids = record
+
+    roles = [r for r in member.roles if r.managed]
+    # роли, удалённые за время отсидки, просто пропускаются
+    roles += [role for role in map(guild.get_role, role_ids) if role is not None and role not in roles]
+    try:
+        async with prison_slot(guild.id):
+            await member.edit(nick=nick, roles=roles, reason=audit_reason)
+    except Exception as e:
+        logger.warning("Cannot release %s: %s", member.id, e)
+        return f"{member.mention}: {MSGS['release_fail']}"
+
+    prisoners.release(guild.id, member.id)
+    logger.info("User %s released", member.id)
+    return MSGS["release_success"].format(target=member.mention)
+
+
+async def report(interaction: discord.Interaction, lines: list[str], reason: str | None = None):
+    embed = discord.Embed(description="\n".join(lines)[:4096], color=random.choice(COLORS))
+    if reason:
+        embed.add_field(
+            name=MSGS["prison_embed_reason_field"],
+            value=reason,
+            inline=False,
+        )
+    await interaction.followup.send(embed=embed)
+
+
 @bot.tree.command(
     name=CMD["prison"]["name"],
     description=CMD["prison"]["description"],
@@ -943,116 +2339,169 @@ async def send_message(interaction: discord.Interaction, message: str):
 @app_commands.describe(
     target=CMD["prison"]["option_description"],
     reason=CMD["prison"]["reason_description"],
+    others=CMD["prison"]["others_description"],
 )
+@metrics.timed("prison_command")
 async def prison(
     interaction: discord.Interaction,
     target: discord.User,
     reason: str = None,
+    others: str = None,
 ):
     try:
-        guild = bot.get_guild(GUILD_ID)
-
-        if guild is None:
-            await interaction.response.send_message(
-                MSGS["prison_fail"], ephemeral=True
-            )
-            return
-
-        caller = guild.get_member(interaction.user.id)
-        if caller is None or not any(r.id == STAFF_ROLE_ID for r in caller.roles):
-            await interaction.response.send_message(
-                MSGS["no_permission"], ephemeral=True
-            )
-            return
-
-        member = guild.get_member(target.id)
-        if member is None:
-            await interaction.response.send_message(
-                MSGS["target_not_member"], ephemeral=True
-            )
+        resolved = await resolve_targets(interaction, target, others)
+        if resolved is None:
             return
+        guild, config_guild, members, lines = resolved
+        await interaction.response.defer()
 
-        inmate_number = random.randint(0, 9999)
-        new_nick = MSGS["prison_nickname_format"].format(number=f"{inmate_number:04d}")
-
-        actual_reason = reason or MSGS["prison_default_reason"]
         audit_reason = MSGS["prison_audit_reason"].format(
             staff=interaction.user,
-            reason=actual_reason,
+            reason=reason or MSGS["prison_default_reason"],
         )
+        lines += await asyncio.gather(
+            *(imprison_one(guild, config_guild, member, audit_reason) for member in members)
+        )
+        await report(interaction, lines, reason)
+        logger.info("%s users processed by /prison from %s", len(members), interaction.user.id)
 
-        # смена ника
+    except Exception as e:
+        logger.exception("/prison error: %s", e)
         try:
-            await member.edit(nick=new_nick, reason=audit_reason)
-        except discord.Forbidden:
-            logger.warning(f"Cannot change nick for {member.id}")
-        except Exception as e:
-            logger.error(f"Nick change error: {e}")
+            if not interaction.response.is_done():
+                await interaction.response.send_message(
+                    MSGS["prison_fail"], ephemeral=True
+                )
+        except Exception:
+            pass
 
-        # удаление ролей
-        try:
-            roles_to_remove = [r for r in member.roles if r != guild.default_role]
-            if roles_to_remove:
-                await member.remove_roles(*roles_to_remove, reason=audit_reason)
-        except discord.Forbidden:
-            logger.warning(f"Cannot remove roles from {member.id}")
-        except Exception as e:
-            logger.error(f"Role removal error: {e}")
 
-        # выдача роли заключённого
-        try:
-            prisoner_role = guild.get_role(PRISONER_ROLE)
-            if prisoner_role:
-                await member.add_roles(prisoner_role, reason=audit_reason)
-        except discord.Forbidden:
-            logger.warning(f"Cannot add prisoner role to {member.id}")
-        except Exception as e:
-            logger.error(f"Role add error: {e}")
+# ===================== /release ===========================
 
-        embed = discord.Embed(
-            description=MSGS["prison_success"].format(
-                target=target.mention,
-                new_nick=new_nick,
-            ),
-            color=random.choice(COLORS),
-        )
-        if reason:
-            embed.add_field(
-                name=MSGS["prison_embed_reason_field"],
-                value=reason,
-                inline=False,
-            )
+@bot.tree.command(
+    name=CMD["release"]["name"],
+    description=CMD["release"]["description"],
+)
+@app_commands.describe(
+    target=CMD["release"]["option_description"],
+    others=CMD["release"]["others_description"],
+)
+@metrics.timed("release_command")
+async def release(
+    interaction: discord.Interaction,
+    target: discord.User,
+    others: str = None,
+):
+    try:
+        resolved = await resolve_targets(interaction, target, others)
+        if resolved is None:
+            return
+        guild, _, members, lines = resolved
+        await interaction.response.defer()
 
-        await interaction.response.send_message(embed=embed)
-        logger.info(f"User {target.id} imprisoned by {interaction.user.id}")
+        audit_reason = MSGS["release_audit_reason"].format(staff=interaction.user)
+        lines += await asyncio.gather(
+            *(release_one(guild, member, audit_reason) for member in members)
+        )
+        await report(interaction, lines)
+        logger.info("%s users processed by /release from %s", len(members), interaction.user.id)
 
-    except discord.Forbidden:
-        try:
-            await interaction.response.send_message(
-                MSGS["prison_fail"], ephemeral=True
-            )
-        except Exception:
-            pass
     except Exception as e:
-        logger.error(f"/prison error: {e}\n{traceback.format_exc()}")
+        logger.exception("/release error: %s", e)
         try:
             if not interaction.response.is_done():
                 await interaction.response.send_message(
-                    MSGS["prison_fail"], ephemeral=True
+                    MSGS["release_fail"], ephemeral=True
                 )
         except Exception:
             pass
 
 
+# ==================== перезагрузка конфига ====================
+
+# эти секции разбираются один раз при запуске, для них нужен рестарт
+RESTART_SECTIONS = ("bot", "guild", "commands", "storage", "metrics")
+
+
+def reload_config():
+    """Перечитывает config.yml по SIGHUP и подменяет всё, что из него выведено.
+
+    Новый конфиг сначала целиком собирается и проверяется, глобальные
+    имена переключаются только после этого: ошибка в файле оставляет бота
+    на старом конфиге. Идущие окна колдуна доживают до своего конца.
+    """
+    global config, COLORS, MSGS, WIZARD, WEBHOOKS, PRISON, ANONYMOUS, FLOOD, TRANSFORM_CACHE, TRANSFORMS, GUILDS
+    global CHAOS_EFFECTS
+
+    try:
+        new_config = read_config(CONFIG_PATH)
+        guilds = load_guilds(new_config)
+        chaos = {g.id: compile_chaos(g.chaos_stacks) for g in guilds.values()}
+        validate_effects(guilds, new_config["webhooks"])
+    except Exception as e:
+        logger.error("Config reload failed, keeping the old config: %s", e)
+        return
+
+    stale = [key for key in RESTART_SECTIONS if new_config.get(key) != config.get(key)]
+    if stale:
+        logger.warning("Config sections changed but need a restart: %s", ", ".join(stale))
+
+    config = new_config
+    COLORS = tuple(config["embed_colors"])
+    MSGS = config["messages"]
+    WIZARD = config["wizard"]
+    EFFECTS.configure(WIZARD["effects"])
+    WEBHOOKS = config["webhooks"]
+    PRISON = config["prison"]
+    ANONYMOUS = config["anonymous"]
+    FLOOD = config["flood"]
+    TRANSFORM_CACHE = config.get("transform_cache") or {"size": 4096}
+    transform_cache.resize(TRANSFORM_CACHE["size"])
+    # размер пула меняется только перезапуском
+    TRANSFORMS = config.get("transforms") or TRANSFORMS
+    prison_slots.clear()
+    GUILDS = guilds
+    CHAOS_EFFECTS = chaos
+
+    for guild_id in list(user_cooldowns):
+        if guild_id not in guilds:
+            del user_cooldowns[guild_id]
+    for guild in guilds.values():
+        if guild.id in user_cooldowns:
+            user_cooldowns[guild.id].seconds = guild.cooldown
+        else:
+            user_cooldowns[guild.id] = CooldownStore(db, guild.id, guild.cooldown)
+
+    states = {state.guild.id: state for state in wizards.values()}
+    wizards.clear()
+    for guild in guilds.values():
+        state = states.pop(guild.id, None)
+        if state is None:
+            state = WizardState(db, guild)
+        else:
+            state.guild = guild
+            if state.cycle is not None:
+                state.cycle.change_interval(hours=guild.interval_hours)
+        wizards[guild.wizard_channel] = state
+    for state in states.values():
+        if state.cycle is not None:
+            state.cycle.cancel()
+
+    if bot.is_ready():
+        spawn(start_wizards())
+    logger.info("Config reloaded: %s guilds", len(guilds))
+
+
 # ==================== запуск ====================
 
 if __name__ == "__main__":
     try:
         logger.info("Starting bot...")
-        bot.run(BOT_TOKEN)
+        # логи discord.py идут через ту же очередь, без своего синхронного хендлера
+        bot.run(BOT_TOKEN, log_handler=None)
     except discord.LoginFailure:
         logger.critical("Invalid bot token!")
     except Exception as e:
 
-        logger.critical(f"Failed to start bot: {e}\n{traceback.format_exc()}")
+        logger.critical("Failed to start bot: %s", e, exc_info=True)
 